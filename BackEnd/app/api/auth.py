@@ -1,25 +1,30 @@
 from fastapi import APIRouter, HTTPException
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
 from app.models.user import UserCreate, UserLogin
 from app.utils.auth import hash_password, verify_password, create_access_token
-from app.db.mongodb import db
+from app.db.mongodb import async_db
 
 router = APIRouter()
-users = db.users
+users = async_db.users
 
+# bcrypt is deliberately slow, so hashing and verifying run in the threadpool
 @router.post("/auth/register")
-def register(user: UserCreate):
-    if users.find_one({"email": user.email}):
+async def register(user: UserCreate):
+    if await users.find_one({"email": user.email}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    hashed_password = await run_in_threadpool(hash_password, user.password)
+    try:
+        await users.insert_one({"email": user.email, "hashed_password": hashed_password})
+    except DuplicateKeyError:
+        # Registered concurrently; the unique index on email rejected the second insert
         raise HTTPException(status_code=400, detail="Email already registered")
-    users.insert_one({
-        "email": user.email,
-        "hashed_password": hash_password(user.password)
-    })
     return {"msg": "User registered successfully"}
 
 @router.post("/auth/login")
-def login(user: UserLogin):
-    db_user = users.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["hashed_password"]):
+async def login(user: UserLogin):
+    db_user = await users.find_one({"email": user.email}, {"hashed_password": 1})
+    if not db_user or not await run_in_threadpool(verify_password, user.password, db_user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token({"sub": user.email})
     return {"access_token": token, "token_type": "bearer"}
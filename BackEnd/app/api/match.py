@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from app.api.search import load_results
+from app.models.match import JobMatchRequest
+from app.utils.auth import decode_token
+from app.utils.term_matrix import match_job_description
+
+router = APIRouter()
+security = HTTPBearer()
+
+# Most weighted job description terms echoed back, heaviest first
+TOP_TERMS_SHOWN = 20
+
+@router.post("/match-candidates")
+async def match_candidates(request: JobMatchRequest, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Rank every indexed CV against a pasted job description"""
+    if not decode_token(credentials.credentials):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Weighting and scoring are CPU bound and the first call loads the matrix, keep them off the event loop
+    ranked, total, weights = await run_in_threadpool(match_job_description, request.job_description, request.limit)
+    top_terms = sorted(weights.items(), key=lambda item: item[1], reverse=True)[:TOP_TERMS_SHOWN]
+    return {
+        "results": await load_results(ranked),
+        "total": total,
+        "query_terms": {term: round(weight, 3) for term, weight in top_terms}
+    }
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.utils import metrics
+
+router = APIRouter()
+
+# Version of the Prometheus text exposition format served
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Parse stage and MongoDB command latencies, in the Prometheus text format.
+
+    The metrics are kept per process. Under app.serve, each worker has its own, and a scrape
+    sees whichever worker accepted it. Scrape a single-worker deployment, or add up several
+    scrapes, when every request has to be counted."""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
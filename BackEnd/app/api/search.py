@@ -1,64 +1,145 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.db.mongodb import db
+from starlette.concurrency import run_in_threadpool
+from app.db.mongodb import async_db
 from app.utils.auth import decode_token
-from app.utils.scorer import compute_match_score
+from app.utils import query_cache
+from app.utils import boolean_query, semantic
+from app.utils.boolean_query import QuerySyntaxError
+from app.utils.scorer import bm25_scores, field_match_score, top_k
+from app.utils.indexer import corpus_stats, field_tokens_from_postings
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from fastapi.responses import JSONResponse
+from bson import ObjectId
 
 router = APIRouter()
 security = HTTPBearer()
 
-def parse_boolean_query(query: str):
-    query = query.lower()
-    if ' or ' in query:
-        keywords = [kw.strip() for kw in query.split(' or ')]
-        mode = 'OR'
-    else:
-        keywords = [kw.strip() for kw in query.split(' and ')] if ' and ' in query else query.split()
-        mode = 'AND'
-    return keywords, mode
+# Fields returned for each search hit; raw_text is never needed to rank
+RESULT_PROJECTION = {
+    "user_email": 1, "original_filename": 1, "stored_filename": 1, "upload_time": 1, "name": 1,
+    "email": 1, "skills": 1, "current_position": 1, "current_company": 1, "total_experience_years": 1,
+}
+
+async def load_results(ranked: List[Tuple[ObjectId, float]]) -> List[dict]:
+    """Result entries of ranked (cv_id, score) pairs, in rank order, loaded with one query"""
+    if not ranked:
+        return []
+    cursor = async_db.cvs.find({"_id": {"$in": [cv_id for cv_id, _ in ranked]}}, RESULT_PROJECTION)
+    cvs = {cv["_id"]: cv async for cv in cursor}
+    results = []
+    for cv_id, score in ranked:
+        cv = cvs.get(cv_id)
+        if not cv:
+            continue
+        results.append({
+            "user_email": cv.get("user_email"),
+            "original_filename": cv.get("original_filename"),
+            "stored_filename": cv.get("stored_filename"),
+            "match_score": round(score, 2),
+            "upload_time": cv["upload_time"].isoformat() if cv.get("upload_time") else None,
+            "name": cv.get("name"),
+            "email": cv.get("email"),
+            "skills": cv.get("skills", []),
+            "current_position": cv.get("current_position"),
+            "current_company": cv.get("current_company"),
+            "total_experience_years": cv.get("total_experience_years"),
+        })
+    return results
+
+def rank_cvs(parsed_query: boolean_query.Node, limit: int, variants: Optional[Dict[str, Tuple[str, float]]] = None):
+    """Match the query against the postings and return the top (cv_id, score) pairs and the match count.
+
+    Only terms outside a NOT contribute to the score; a purely negative query ranks its matches
+    equally. `variants` are the fuzzy variants from boolean_query.expand_fuzzy: each counts as
+    the query token it stands for, at that variant's weight.
+    """
+    matched_ids, postings_by_term = boolean_query.search(parsed_query)
+    if not matched_ids:
+        return [], 0
+
+    variants = variants or {}
+    doc_count, avg_doc_len = corpus_stats()
+    query_terms = boolean_query.positive_terms(parsed_query)
+    weights = {variant: weight for variant, (_, weight) in variants.items()}
+    scores = dict.fromkeys(matched_ids, 0.0)
+    for cv_id, score in bm25_scores(query_terms, postings_by_term, doc_count, avg_doc_len,
+                                    candidates=matched_ids, weights=weights).items():
+        scores[cv_id] += score
+    scored_postings = {term: postings_by_term[term] for term in set(query_terms)}
+    query_token_set = {variants[term][0] if term in variants else term for term in query_terms}
+    for cv_id, fields in field_tokens_from_postings(scored_postings, matched_ids).items():
+        if variants:
+            fields = {field: {variants[term][0] if term in variants else term for term in tokens}
+                      for field, tokens in fields.items()}
+        scores[cv_id] += field_match_score(query_token_set, fields)
+    return top_k(scores, limit), len(matched_ids)
+
+
+def expand_query(parsed_query: boolean_query.Node):
+    """Fuzzy expansion of a query, leaving out variants that are query tokens in their own right"""
+    expanded, variants = boolean_query.expand_fuzzy(parsed_query)
+    query_tokens = set(boolean_query.positive_terms(parsed_query))
+    return expanded, {variant: info for variant, info in variants.items() if variant not in query_tokens}
+
+async def semantic_search(query: str, limit: int) -> JSONResponse:
+    cache_key, cached = await query_cache.get(query_cache.cache_key(" ".join(query.lower().split()), limit, "semantic"))
+    if cached is not None:
+        return JSONResponse(content=cached)
+
+    # Embedding the query and scanning the probed lists are CPU bound
+    ranked = await run_in_threadpool(semantic.search, query, limit)
+    if ranked is None:
+        raise HTTPException(status_code=503, detail="Semantic index not built; run python -m app.utils.semantic")
+    response = {"results": await load_results(ranked), "total": len(ranked)}
+    await query_cache.put(cache_key, response)
+    return JSONResponse(content=response)
 
 @router.get("/search-cvs")
-def search_cvs(query: str = Query(..., description="Boolean query: e.g., 'python AND flask' or 'react OR nextjs'"), 
-               credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def search_cvs(query: str = Query(..., description="Boolean query with AND, OR, NOT, parentheses and quoted phrases: e.g., 'python AND (flask OR django) NOT \"php developer\"'"),
+                     limit: int = Query(50, ge=1, le=500, description="Maximum number of ranked results"),
+                     fuzzy: bool = Query(False, description="Also match indexed terms within one or two typos of each query word"),
+                     semantic_mode: bool = Query(False, alias="semantic", description="Rank CVs by meaning: the query is free text, e.g. 'server-side developer'"),
+                     credentials: HTTPAuthorizationCredentials = Depends(security)):
 
     token = credentials.credentials
     user_data = decode_token(token)
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    keywords, mode = parse_boolean_query(query)
-    cvs = db.cvs.find()
-    results = []
+    if semantic_mode:
+        return await semantic_search(query, limit)
 
-    for cv in cvs:
-        text = cv.get("raw_text", "").lower()
-
-        if mode == "AND":
-            matched = all(kw in text for kw in keywords)
-        else:  # OR
-            matched = any(kw in text for kw in keywords)
-
-        if matched:
-            score = compute_match_score(text, query)
-            if score > 0:
-                results.append({
-                    "user_email": cv.get("user_email"),
-                    "original_filename": cv.get("original_filename"),
-                    "stored_filename": cv.get("stored_filename"),
-                    "match_score": score,
-                    "upload_time": cv.get("upload_time"),
-                    "name": cv.get("name"),
-                    "email": cv.get("email"),
-                    "skills": cv.get("skills", []),
-                    "current_position": cv.get("current_position"),
-                    "current_company": cv.get("current_company"),
-                    "total_experience_years": cv.get("total_experience_years"),
-                })
-
-    results.sort(key=lambda x: x["match_score"], reverse=True)
-    return JSONResponse(content={"results": results})
+    try:
+        parsed_query = boolean_query.parse_query(query)
+    except QuerySyntaxError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid query: {e}")
+    if parsed_query is None:
+        return JSONResponse(content={"results": [], "total": 0})
 
+    cache_key, cached = await query_cache.get(query_cache.cache_key(boolean_query.canonical(parsed_query), limit, "fuzzy" if fuzzy else "exact"))
+    if cached is not None:
+        return JSONResponse(content=cached)
 
+    # Posting lookups and scoring are blocking and CPU bound, keep them off the event loop
+    variants = {}
+    if fuzzy:
+        parsed_query, variants = await run_in_threadpool(expand_query, parsed_query)
+    ranked, total = await run_in_threadpool(rank_cvs, parsed_query, limit, variants)
+    extra = {}
+    if fuzzy:
+        expanded_terms = {}
+        for variant, (token, _) in variants.items():
+            expanded_terms.setdefault(token, []).append(variant)
+        extra["expanded_terms"] = expanded_terms
+    response = {"results": await load_results(ranked), "total": total, **extra}
+    await query_cache.put(cache_key, response)
+    return JSONResponse(content=response)
+
+
+@router.get("/search-cvs/cache-stats")
+async def search_cache_stats(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not decode_token(credentials.credentials):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return await query_cache.cache_stats()
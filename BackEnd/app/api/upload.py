@@ -2,19 +2,21 @@ from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import FileResponse
 from uuid import uuid4
+import asyncio
 import os
 from datetime import datetime
 from bson import ObjectId
-from typing import Optional
+from typing import List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+import hashlib
 import json
+import zipfile
 
 from app.utils.auth import decode_token
-from app.utils.parser import (
-    extract_text_from_pdf,
-    extract_text_from_docx,
-    parse_cv_enhanced
-)
-from app.db.mongodb import db
+from app.utils import ingest, parse_cache, semantic, text_store
+from app.db.mongodb import async_db
+from app.utils.indexer import remove_cv
+from app.utils.parser import with_file_name
 
 router = APIRouter()
 security = HTTPBearer()
@@ -22,6 +24,63 @@ security = HTTPBearer()
 UPLOAD_DIR = "uploaded_cvs"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+MAX_FILE_SIZE = 10 * 1024 * 1024
+ALLOWED_CONTENT_TYPES = [
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+]
+ZIP_CONTENT_TYPES = ["application/zip", "application/x-zip-compressed"]
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "1000"))
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def reserve_path(original_name: str) -> Tuple[str, str]:
+    """Pick a unique stored filename for an upload, keeping the original extension"""
+    ext = os.path.splitext(original_name)[1].lower()
+    filename = f"{uuid4()}{ext}"
+    return filename, os.path.join(UPLOAD_DIR, filename)
+
+
+def save_upload(source, path: str) -> Tuple[int, str]:
+    """Copy an upload to `path` chunk by chunk, hashing it and enforcing MAX_FILE_SIZE as it
+    arrives (file.size is often unset). Returns the size and sha256; nothing is left at `path`
+    when the upload is rejected."""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(status_code=400, detail="File size too large. Maximum 10MB allowed")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return size, digest.hexdigest()
+
+
+def cached_file(entry: Optional[dict]) -> Optional[str]:
+    """Stored filename of a parse cache entry, if that file is still on disk"""
+    if not entry or not entry.get("stored_filename"):
+        return None
+    if not os.path.exists(os.path.join(UPLOAD_DIR, entry["stored_filename"])):
+        return None
+    return entry["stored_filename"]
+
+
+def parse_tags(tags: Optional[str]) -> list:
+    """Parse tags from JSON string if provided"""
+    if not tags:
+        return []
+    try:
+        tags_list = json.loads(tags)
+    except Exception:
+        return []
+    return tags_list if isinstance(tags_list, list) else []
+
 
 @router.post("/upload-cv")
 async def upload_cv(
@@ -37,123 +96,325 @@ async def upload_cv(
         raise HTTPException(status_code=400, detail="Filename not provided in upload.")
 
     # Validate file type
-    if file.content_type not in [
-        "application/pdf",
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    ]:
+    if file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Only PDF or DOCX files are allowed")
 
     # Validate file size (10MB limit)
-    if file.size and file.size > 10 * 1024 * 1024:
+    if file.size and file.size > MAX_FILE_SIZE:
         raise HTTPException(status_code=400, detail="File size too large. Maximum 10MB allowed")
 
-    # Save with original filename, resolve conflicts
     original_name = file.filename
-    filename = original_name
-    path = os.path.join(UPLOAD_DIR, filename)
+    ext = original_name.split(".")[-1].lower()
+    if ext not in ("pdf", "docx"):
+        raise HTTPException(status_code=400, detail="Unsupported file format")
 
-    counter = 1
-    while os.path.exists(path):
-        name_part, ext = os.path.splitext(original_name)
-        filename = f"{name_part}_{counter}{ext}"
-        path = os.path.join(UPLOAD_DIR, filename)
-        counter += 1
+    filename, path = reserve_path(original_name)
+    file_size, sha = await run_in_threadpool(save_upload, file.file, path)
 
     try:
-        # Save uploaded file
-        with open(path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Extract text
-        ext = filename.split(".")[-1].lower()
-        if ext == "pdf":
-            extracted_text = extract_text_from_pdf(path)
-        elif ext == "docx":
-            extracted_text = extract_text_from_docx(path)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format")
-
-        if not extracted_text or len(extracted_text.strip()) < 50:
-            raise HTTPException(status_code=422, detail="Could not extract sufficient text from CV")
-
-        parsed_data = parse_cv_enhanced(extracted_text, file_name=original_name)
+        # Byte-identical uploads share the stored file and the parse result
+        cached = await run_in_threadpool(parse_cache.lookup, sha)
+        cached_filename = cached_file(cached)
+        if cached_filename is not None:
+            os.remove(path)
+            filename, path = cached_filename, None
 
-        # Parse tags from JSON string if provided
-        tags_list = []
-        if tags:
-            try:
-                tags_list = json.loads(tags)
-                if not isinstance(tags_list, list):
-                    tags_list = []
-            except Exception:
-                tags_list = []
-
-        # Prepare DB entry
-        db_entry = parsed_data.copy()
-        db_entry.update({
+        tags_list = parse_tags(tags)
+        db_entry = {
             "user_email": user_email,
             "original_filename": original_name,
             "stored_filename": filename,
-            "file_size": file.size,
+            "file_size": file_size,
             "file_type": ext,
             "upload_time": datetime.utcnow(),
-            "processing_status": "completed",
-            "text_length": len(extracted_text),
-            "tags": tags_list
-        })
+            "tags": tags_list,
+            "content_hash": sha
+        }
+        metadata = {
+            "original_filename": original_name,
+            "file_size": file_size,
+            "upload_time": db_entry["upload_time"].isoformat()
+        }
+
+        if cached:
+            if path:
+                # The cached copy of the file is gone, keep the one just saved instead
+                await run_in_threadpool(parse_cache.set_stored_filename, sha, filename)
+            parsed_data = with_file_name(cached["parsed"], original_name)
+            cv_ids = await run_in_threadpool(ingest.insert_parsed_cvs, [(db_entry, parsed_data)])
+            cv_id = str(cv_ids[0])
+            return {
+                "message": "CV already parsed, reused the earlier result",
+                "cv_id": cv_id,
+                "processing_status": "completed",
+                "metadata": {"cv_id": cv_id, **metadata}
+            }
 
-        result = db.cvs.insert_one(db_entry)
+        # Record the CV as queued; the ingestion workers fill in the parsed fields
+        db_entry["processing_status"] = "queued"
+        result = await async_db.cvs.insert_one(db_entry)
         cv_id = str(result.inserted_id)
 
-        response_parsed_data = parsed_data.copy()
-        response_parsed_data.pop("raw_text", None)
+        try:
+            ingest.enqueue(ingest.IngestJob(result.inserted_id, path, ext, original_name, sha))
+        except asyncio.QueueFull:
+            await async_db.cvs.delete_one({"_id": result.inserted_id})
+            raise HTTPException(status_code=503, detail="Too many CVs are being processed, please retry shortly")
 
         return {
-            "message": "CV uploaded and parsed successfully",
+            "message": "CV uploaded and queued for parsing",
             "cv_id": cv_id,
-            "parsed_data": response_parsed_data,
-            "analysis": {
-                "summary": {
-                    "name": parsed_data.get("name"),
-                    "total_experience_years": parsed_data.get("total_experience_years"),
-                    "current_position": parsed_data.get("current_position"),
-                    "current_company": parsed_data.get("current_company"),
-                    "total_skills_found": len(parsed_data.get("skills", [])),
-                    "skills_categories_found": len(parsed_data.get("skills_by_category", {})),
-                    "education_entries": len(parsed_data.get("education", [])),
-                    "job_entries": len(parsed_data.get("job_entries", [])),
-                    "contact_info": {
-                        "emails": len(parsed_data.get("emails", [])),
-                        "phone_numbers": len(parsed_data.get("phone_numbers", []))
-                    }
-                }
-            },
-            "metadata": {
-                "cv_id": cv_id,
-                "original_filename": original_name,
-                "file_size": file.size,
-                "upload_time": db_entry["upload_time"].isoformat(),
-                "text_length": len(extracted_text)
-            }
+            "processing_status": "queued",
+            "metadata": {"cv_id": cv_id, **metadata}
         }
 
+    except HTTPException:
+        if path and os.path.exists(path):
+            os.remove(path)
+        raise
     except Exception as e:
-        if os.path.exists(path):
+        if path and os.path.exists(path):
             os.remove(path)
         raise HTTPException(status_code=500, detail=f"Error processing CV: {str(e)}")
 
 
+def stage_bulk_files(files: List[UploadFile]) -> Tuple[list, list]:
+    """Save every CV of a bulk upload, streaming ZIP entries one by one into UPLOAD_DIR.
+
+    Returns the per-file outcomes, in upload order, and the (outcome index, path, file_type,
+    content hash) of each file that is ready to parse.
+    """
+    outcomes = []
+    staged = []
+
+    def stage(name: str, source, size: Optional[int]):
+        name = os.path.basename(name)
+        ext = os.path.splitext(name)[1].lower().lstrip(".")
+        outcome = {"filename": name, "status": "failed"}
+        outcomes.append(outcome)
+        if ext not in ("pdf", "docx"):
+            outcome["error"] = "Only PDF or DOCX files are allowed"
+        elif size and size > MAX_FILE_SIZE:
+            outcome["error"] = "File size too large. Maximum 10MB allowed"
+        elif len(staged) >= BULK_MAX_FILES:
+            outcome["error"] = f"Too many files. Maximum {BULK_MAX_FILES} per bulk upload"
+        else:
+            filename, path = reserve_path(name)
+            digest = hashlib.sha256()
+            with open(path, "wb") as f:
+                for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+            outcome["stored_filename"] = filename
+            staged.append((len(outcomes) - 1, path, ext, digest.hexdigest()))
+
+    for upload in files:
+        name = upload.filename or ""
+        if upload.content_type in ZIP_CONTENT_TYPES or name.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                outcomes.append({"filename": name, "status": "failed", "error": "Invalid ZIP archive"})
+                continue
+            with archive:
+                for info in archive.infolist():
+                    if info.is_dir() or os.path.basename(info.filename).startswith("."):
+                        continue
+                    with archive.open(info) as source:
+                        stage(info.filename, source, info.file_size)
+        else:
+            upload.file.seek(0, os.SEEK_END)
+            size = upload.file.tell()
+            upload.file.seek(0)
+            stage(name, upload.file, size)
+    return outcomes, staged
+
+
+@router.post("/upload-cvs/bulk")
+async def bulk_upload_cvs(
+    files: List[UploadFile] = File(...),
+    tags: str = Form(None),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Upload many CVs at once, as individual files and/or ZIP archives, and parse them in parallel"""
+    token = credentials.credentials
+    user_data = decode_token(token)
+    user_email = user_data.get("sub")
+    tags_list = parse_tags(tags)
+
+    outcomes, staged = await run_in_threadpool(stage_bulk_files, files)
+    # Staged files the stored CVs refer to; every other one is removed on the way out, also when
+    # something below raises
+    kept_paths = set()
+    try:
+        # Only parse files whose content was never parsed before, and each distinct content once
+        known = await run_in_threadpool(parse_cache.lookup_many, [sha for *_, sha in staged])
+        to_parse = {}
+        for index, path, ext, sha in staged:
+            if sha not in known and sha not in to_parse:
+                to_parse[sha] = (path, ext, outcomes[index]["filename"])
+        try:
+            parse_results = await ingest.parse_many(list(to_parse.values()))
+        except Exception as e:
+            parse_results = [e] * len(to_parse)
+        parsed_by_hash = dict(zip(to_parse, parse_results))
+
+        upload_time = datetime.utcnow()
+        parsed_entries = []
+        parsed_indexes = []
+        new_paths = []
+        new_results = []
+        for index, path, ext, sha in staged:
+            outcome = outcomes[index]
+            cached = known.get(sha)
+            parsed_data = cached["parsed"] if cached else parsed_by_hash[sha]
+            if isinstance(parsed_data, Exception):
+                outcome["error"] = str(parsed_data)
+                outcome.pop("stored_filename", None)
+                continue
+            # The result may come from a file with the same content but another name
+            parsed_data = with_file_name(parsed_data, outcome["filename"])
+            file_size = os.path.getsize(path)
+            stored_filename = cached_file(cached)
+            if stored_filename:
+                # Same content as a file already stored, the new copy is dropped
+                outcome["stored_filename"] = stored_filename
+            else:
+                known[sha] = {"stored_filename": outcome["stored_filename"], "parsed": parsed_data}
+                new_results.append((sha, outcome["stored_filename"], parsed_data))
+                new_paths.append(path)
+            parsed_entries.append(({
+                "user_email": user_email,
+                "original_filename": outcome["filename"],
+                "stored_filename": outcome["stored_filename"],
+                "file_size": file_size,
+                "file_type": ext,
+                "upload_time": upload_time,
+                "tags": tags_list,
+                "content_hash": sha
+            }, parsed_data))
+            parsed_indexes.append(index)
+
+        try:
+            cv_ids = await run_in_threadpool(ingest.insert_parsed_cvs, parsed_entries)
+            kept_paths.update(new_paths)
+        except Exception as e:
+            for index in parsed_indexes:
+                outcomes[index]["error"] = f"Error storing CV: {str(e)}"
+                outcomes[index].pop("stored_filename", None)
+            cv_ids = []
+            parsed_indexes = []
+            new_results = []
+        try:
+            await run_in_threadpool(parse_cache.store_many, new_results)
+        except Exception as e:
+            # The CVs are stored, only later uploads of the same files miss the cache
+            print(f"Could not cache bulk parse results: {e}")
+        for index, cv_id, (_, parsed_data) in zip(parsed_indexes, cv_ids, parsed_entries):
+            outcomes[index].update({
+                "status": "completed",
+                "cv_id": str(cv_id),
+                "name": parsed_data.get("name")
+            })
+    finally:
+        for _, path, _, _ in staged:
+            if path not in kept_paths and os.path.exists(path):
+                os.remove(path)
+
+    return {
+        "message": f"Processed {len(outcomes)} files",
+        "completed": len(cv_ids),
+        "failed": len(outcomes) - len(cv_ids),
+        "results": outcomes
+    }
+
+
+# Fields read by the status endpoint and build_analysis
+STATUS_PROJECTION = {
+    "processing_status": 1, "processing_error": 1, "original_filename": 1, "name": 1,
+    "total_experience_years": 1, "current_position": 1, "current_company": 1, "skills": 1,
+    "skills_by_category": 1, "education": 1, "job_entries": 1, "emails": 1, "phone_numbers": 1,
+}
+LIST_PROJECTION = {
+    "original_filename": 1, "stored_filename": 1, "upload_time": 1, "processing_status": 1,
+    "name": 1, "tags": 1,
+}
+DELETE_PROJECTION = {"original_filename": 1, "stored_filename": 1, "upload_time": 1}
+
+
+def build_analysis(cv: dict) -> dict:
+    """Summary of a parsed CV as returned once processing has completed"""
+    return {
+        "summary": {
+            "name": cv.get("name"),
+            "total_experience_years": cv.get("total_experience_years"),
+            "current_position": cv.get("current_position"),
+            "current_company": cv.get("current_company"),
+            "total_skills_found": len(cv.get("skills", [])),
+            "skills_categories_found": len(cv.get("skills_by_category", {})),
+            "education_entries": len(cv.get("education", [])),
+            "job_entries": len(cv.get("job_entries", [])),
+            "contact_info": {
+                "emails": len(cv.get("emails", [])),
+                "phone_numbers": len(cv.get("phone_numbers", []))
+            }
+        }
+    }
+
+
+@router.get("/cv/{cv_id}/status")
+async def cv_status(cv_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    user_data = decode_token(token)
+    user_email = user_data.get("sub")
+
+    if not ObjectId.is_valid(cv_id):
+        raise HTTPException(status_code=404, detail="CV not found")
+    cv = await async_db.cvs.find_one({"_id": ObjectId(cv_id), "user_email": user_email}, STATUS_PROJECTION)
+    if not cv:
+        raise HTTPException(status_code=404, detail="CV not found")
+
+    status = cv.get("processing_status", "unknown")
+    response = {
+        "cv_id": cv_id,
+        "processing_status": status,
+        "original_filename": cv.get("original_filename")
+    }
+    if status == "completed":
+        response["analysis"] = build_analysis(cv)
+    elif status == "failed":
+        response["error"] = cv.get("processing_error")
+    return response
+
+
+@router.get("/cv/{cv_id}/text")
+async def cv_text(cv_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Raw extracted text of a CV, loaded from the text store only on request"""
+    token = credentials.credentials
+    user_data = decode_token(token)
+    user_email = user_data.get("sub")
+
+    if not ObjectId.is_valid(cv_id):
+        raise HTTPException(status_code=404, detail="CV not found")
+    cv = await async_db.cvs.find_one({"_id": ObjectId(cv_id), "user_email": user_email}, {"_id": 1})
+    if not cv:
+        raise HTTPException(status_code=404, detail="CV not found")
+    entry = await async_db.cv_texts.find_one({"_id": cv["_id"]})
+    if not entry:
+        raise HTTPException(status_code=404, detail="CV text not available")
+    return {"cv_id": cv_id, "raw_text": text_store.decompress_text(entry["data"])}
+
+
 @router.get("/list-cvs")
-def list_user_cvs(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def list_user_cvs(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     user_data = decode_token(token)
     user_email = user_data.get("sub")
 
-    user_cvs = db.cvs.find({"user_email": user_email})
+    user_cvs = async_db.cvs.find({"user_email": user_email}, LIST_PROJECTION).sort("upload_time", -1)
 
     result = []
-    for cv in user_cvs:
+    async for cv in user_cvs:
         result.append({
             "id": str(cv["_id"]),
             "filename": cv.get("original_filename"),
@@ -168,11 +429,14 @@ def list_user_cvs(credentials: HTTPAuthorizationCredentials = Depends(security))
 
 
 @router.get("/cv/download/{filename}")
-def download_cv(filename: str):
+async def download_cv(filename: str):
     path = os.path.join(UPLOAD_DIR, filename)
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(path, media_type="application/octet-stream", filename=filename)
+    # Stored files have generated names, offer the name the file was uploaded with
+    cv = await async_db.cvs.find_one({"stored_filename": filename}, {"original_filename": 1})
+    download_name = (cv or {}).get("original_filename") or filename
+    return FileResponse(path, media_type="application/octet-stream", filename=download_name)
 
 
 @router.delete("/cv/{cv_id}")
@@ -185,23 +449,21 @@ async def delete_cv(
     user_email = user_data.get("sub")
 
     try:
-        cv_data = db.cvs.find_one({
+        cv_data = await async_db.cvs.find_one_and_delete({
             "_id": ObjectId(cv_id),
             "user_email": user_email
-        })
+        }, projection=DELETE_PROJECTION)
 
         if not cv_data:
             raise HTTPException(status_code=404, detail="CV not found")
 
-        result = db.cvs.delete_one({
-            "_id": ObjectId(cv_id),
-            "user_email": user_email
-        })
-
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="CV not found")
+        await run_in_threadpool(remove_cv, cv_data["_id"])
+        await run_in_threadpool(text_store.delete_text, cv_data["_id"])
+        await run_in_threadpool(semantic.remove_cv, cv_data["_id"])
 
-        if cv_data.get("stored_filename"):
+        # Repeat uploads share one stored file, keep it while another CV still refers to it
+        stored_filename = cv_data.get("stored_filename")
+        if stored_filename and not await async_db.cvs.find_one({"stored_filename": stored_filename}, {"_id": 1}):
             file_path = os.path.join(UPLOAD_DIR, cv_data["stored_filename"])
             if os.path.exists(file_path):
                 os.remove(file_path)
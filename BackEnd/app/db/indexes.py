@@ -0,0 +1,50 @@
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from app.db.mongodb import db
+from app.utils.indexer import INDEX_CHANGES_TTL
+
+# Collection -> (keys, options) of every index the app's queries rely on
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "cvs": [
+        # /list-cvs, newest first, and the per-user lookups
+        ([("user_email", ASCENDING), ("upload_time", DESCENDING)], {}),
+        # Downloads and the shared-file check on delete
+        ([("stored_filename", ASCENDING)], {}),
+    ],
+    "cv_postings": [
+        ([("term", ASCENDING), ("cv_id", ASCENDING)], {"unique": True}),
+        ([("cv_id", ASCENDING)], {}),
+    ],
+    # Expires the change log read by processes that keep the postings in memory
+    "index_changes": [
+        ([("at", ASCENDING)], {"expireAfterSeconds": INDEX_CHANGES_TTL}),
+    ],
+    "parse_cache": [
+        ([("parser_version", ASCENDING)], {}),
+    ],
+    # Only used by the mongo query cache backend; expires entries
+    "query_cache": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+}
+
+
+def ensure_indexes():
+    """Create any missing index. Creating an existing index is a no-op, so this runs on every startup."""
+    for collection, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # e.g. duplicate emails left from before the unique index; the app still works
+                print(f"Could not create index {keys} on {collection}: {e}")
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    for collection in INDEXES:
+        print(f"{collection}: {sorted(db[collection].index_information())}")
@@ -3,5 +3,54 @@ import os
 from dotenv import load_dotenv
 
 load_dotenv()
-client = MongoClient(os.getenv("MONGODB_URI"))
-db = client["cvtool"]
+MONGODB_URI = os.getenv("MONGODB_URI")
+DB_NAME = "cvtool"
+
+
+def optional_int(name: str):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# Pool size, timeouts and read preference, shared by the sync and async clients. Unset values
+# keep the driver defaults.
+CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": optional_int("MONGODB_MAX_IDLE_TIME_MS"),
+    "waitQueueTimeoutMS": optional_int("MONGODB_WAIT_QUEUE_TIMEOUT_MS"),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+    "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "20000")),
+    "socketTimeoutMS": optional_int("MONGODB_SOCKET_TIMEOUT_MS"),
+    "readPreference": os.getenv("MONGODB_READ_PREFERENCE", "primary"),
+}
+CLIENT_OPTIONS = {key: value for key, value in CLIENT_OPTIONS.items() if value is not None}
+
+# MONGODB_URI=mongomock:// runs against an in-process fake, e.g. to try the API or test it
+# offline. It needs mongomock and mongomock-motor, which are only in requirements-dev.txt.
+USE_MOCK = (MONGODB_URI or "").startswith("mongomock://")
+
+if USE_MOCK:
+    try:
+        import mongomock
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError as e:
+        raise RuntimeError(
+            "MONGODB_URI=mongomock:// needs mongomock and mongomock-motor: pip install -r requirements-dev.txt"
+        ) from e
+
+    client = mongomock.MongoClient()
+    async_client = AsyncMongoMockClient(mock_mongo_client=client)
+else:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from app.utils.metrics import command_metrics
+
+    # Every command, from either client, is timed for the /metrics endpoint
+    client = MongoClient(MONGODB_URI, event_listeners=[command_metrics], **CLIENT_OPTIONS)
+    async_client = AsyncIOMotorClient(MONGODB_URI, event_listeners=[command_metrics], **CLIENT_OPTIONS)
+
+# Blocking handle, for worker threads, background jobs and scripts
+db = client[DB_NAME]
+# Awaitable handle for request handlers, so a slow query never blocks the event loop
+async_db = async_client[DB_NAME]
@@ -1,10 +1,65 @@
 from fastapi import FastAPI
-from app.api import auth, upload, search
+from app.api import auth, upload, search, match, metrics as metrics_api
+from app.db import indexes
+from app.utils import ingest, metrics
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from fastapi.middleware.cors import CORSMiddleware
 app = FastAPI()
+
+
+@app.on_event("startup")
+async def startup():
+    await run_in_threadpool(indexes.ensure_indexes)
+    await ingest.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await ingest.stop()
+
+
+class TraceMiddleware:
+    """Report the parse stages and MongoDB commands of requests sent with an X-Trace header in a
+    Server-Timing response header (of every request, also printed, with METRICS_TRACE_ALL=1).
+
+    Plain ASGI rather than @app.middleware("http"), so a request that is not traced goes
+    straight through to the app."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not (metrics.TRACE_ALL or metrics.TRACE_HEADER in Headers(scope=scope)):
+            await self.app(scope, receive, send)
+            return
+
+        token = metrics.start_trace()
+        spans = metrics.trace_spans()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                timing = metrics.server_timing(spans)
+                if timing:
+                    MutableHeaders(scope=message).append("Server-Timing", timing)
+                if metrics.TRACE_ALL:
+                    print(f"{scope['method']} {scope['path']} {message['status']}: {timing or 'no spans'}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.end_trace(token)
+
+
+app.add_middleware(TraceMiddleware)
+
 app.include_router(auth.router)
 app.include_router(upload.router)
 app.include_router(search.router)
+app.include_router(match.router)
+app.include_router(metrics_api.router)
 
 app.add_middleware(
     CORSMiddleware,
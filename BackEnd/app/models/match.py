@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+class JobMatchRequest(BaseModel):
+    job_description: str = Field(..., min_length=1)
+    limit: int = Field(20, ge=1, le=500)
@@ -0,0 +1,153 @@
+"""Run the API in N uvicorn workers forked from one preloaded supervisor process.
+
+Started with `uvicorn --workers N`, every worker loads its own copy of the spaCy pipeline and
+gazetteers. Here the supervisor loads them once, through parser.load_resources, then forks the
+workers, so all of them share those pages copy-on-write: the model weights, the college
+payloads and the rest of the interpreter state. The gazetteer tries are memory-mapped, so they
+are shared through the page cache either way. gc.freeze() keeps the collector from writing to
+(and so copying) the preloaded objects.
+
+A worker cannot safely fork its ingestion processes the same way, as it is multi-threaded by
+then. They come from a forkserver each worker starts, which loads the resources once more and
+shares them with that worker's ingestion processes (see ingest.INGEST_START_METHOD).
+
+Only the parser is imported before forking. The app itself, and with it the MongoDB clients,
+which must not cross a fork, is imported by each worker.
+
+The supervisor binds the listening socket and hands it to the workers, restarts a worker that
+exits, and stops them all on SIGINT or SIGTERM. Workers keep their own in-memory state,
+including the /metrics registry, so a /metrics scrape only reports the worker that served it.
+
+    python -m app.serve --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+import traceback
+from typing import Dict, List, Optional
+
+import uvicorn
+
+APP = "app.main:app"
+SHUTDOWN_TIMEOUT = 30
+RESTART_DELAY = 1.0
+POLL_INTERVAL = 0.5
+
+
+def preload():
+    """Load the parser's resources and move everything alive out of the collector's reach"""
+    from app.utils.parser import load_resources
+
+    load_resources()
+    gc.collect()
+    gc.freeze()
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    def __init__(self, sock: socket.socket, args):
+        self.sock = sock
+        self.args = args
+        # pid -> worker number
+        self.workers: Dict[int, int] = {}
+        self.stopping = False
+
+    def spawn(self, number: int):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = number
+            return
+        # Worker: uvicorn installs its own handlers for graceful shutdown
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        status = 0
+        try:
+            config = uvicorn.Config(APP, log_level=self.args.log_level, timeout_keep_alive=self.args.keep_alive)
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for number in range(self.args.workers):
+            self.spawn(number)
+        print(f"Serving {APP} on {self.args.host}:{self.args.port} with {self.args.workers} workers "
+              f"(supervisor {os.getpid()}, workers {', '.join(map(str, self.workers))})")
+
+        while not self.stopping:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(POLL_INTERVAL)
+                continue
+            number = self.workers.pop(pid, None)
+            if number is None or self.stopping:
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting it")
+            time.sleep(RESTART_DELAY)
+            self.spawn(number)
+        self.shutdown()
+
+    def shutdown(self):
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        while self.workers and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.workers:
+            print(f"Worker {pid} did not stop in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.clear()
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description="Serve the API from workers forked off a preloaded process")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8000)
+    arg_parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    arg_parser.add_argument("--backlog", type=int, default=2048)
+    arg_parser.add_argument("--keep-alive", type=int, default=5, help="Seconds idle connections are kept open")
+    arg_parser.add_argument("--log-level", default="info")
+    arg_parser.add_argument("--no-preload", action="store_true",
+                            help="Let every worker load its own resources, e.g. to compare memory use")
+    args = arg_parser.parse_args(argv)
+    if args.workers < 1:
+        arg_parser.error("--workers must be at least 1")
+
+    # Each worker runs its own ingestion pool; split the cores between them unless told otherwise
+    os.environ.setdefault("INGEST_WORKERS", str(max(1, (os.cpu_count() or 1) // args.workers)))
+    if not args.no_preload:
+        started = time.perf_counter()
+        preload()
+        print(f"Preloaded parser resources in {time.perf_counter() - started:.1f}s")
+    sock = bind(args.host, args.port, args.backlog)
+    Supervisor(sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from bson import ObjectId
+
+from app.utils import fuzzy
+from app.utils.indexer import fetch_postings, indexed_cv_ids, match_phrase
+from app.utils.scorer import clean_and_tokenize
+
+# Query grammar, loosest binding first. Operators are case-insensitive, adjacent operands are
+# ANDed and a leading "-" negates a word, phrase or group:
+#   query   := or_expr
+#   or_expr := and_expr (OR and_expr)*
+#   and_expr := not_expr ([AND] not_expr)*
+#   not_expr := NOT not_expr | primary
+#   primary := "(" or_expr ")" | "quoted phrase" | word
+OPERATORS = {"and": "AND", "&&": "AND", "or": "OR", "||": "OR", "not": "NOT"}
+WORD_PATTERN = re.compile(r'[^\s()"]+')
+
+
+class QuerySyntaxError(ValueError):
+    """A query that cannot be parsed, e.g. with unbalanced parentheses or a dangling operator"""
+
+
+@dataclass(frozen=True)
+class Term:
+    # Normalized tokens; more than one means they must occur as consecutive terms
+    tokens: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class And:
+    children: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    children: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Not:
+    child: "Node"
+
+
+Node = Union[Term, And, Or, Not]
+PostingsByTerm = Dict[str, Dict[ObjectId, dict]]
+
+
+def tokenize(query: str) -> List[Tuple[str, str]]:
+    """Split a query into (kind, text) tokens of kind LPAREN, RPAREN, AND, OR, NOT, PHRASE or WORD"""
+    tokens = []
+    i = 0
+    while i < len(query):
+        ch = query[i]
+        if ch.isspace():
+            i += 1
+        elif ch == "(":
+            tokens.append(("LPAREN", ch))
+            i += 1
+        elif ch == ")":
+            tokens.append(("RPAREN", ch))
+            i += 1
+        elif ch == '"':
+            end = query.find('"', i + 1)
+            if end == -1:
+                raise QuerySyntaxError("Unterminated quoted phrase")
+            tokens.append(("PHRASE", query[i + 1:end]))
+            i = end + 1
+        else:
+            word = WORD_PATTERN.match(query, i).group()
+            i += len(word)
+            operator = OPERATORS.get(word.lower())
+            if operator:
+                tokens.append((operator, word))
+            elif word.startswith("-"):
+                tokens.append(("NOT", "-"))
+                if len(word) > 1:
+                    tokens.append(("WORD", word[1:]))
+            else:
+                tokens.append(("WORD", word))
+    return tokens
+
+
+def make_term(text: str) -> Optional[Node]:
+    tokens = clean_and_tokenize(text)
+    return Term(tuple(tokens)) if tokens else None
+
+
+def make_group(kind, children: Iterable[Optional[Node]]) -> Optional[Node]:
+    """AND/OR node over the children, flattening nested nodes of the same kind and dropping
+    empty and repeated operands"""
+    flat = []
+    for child in children:
+        if child is None:
+            continue
+        for operand in (child.children if isinstance(child, kind) else (child,)):
+            if operand not in flat:
+                flat.append(operand)
+    if not flat:
+        return None
+    return flat[0] if len(flat) == 1 else kind(tuple(flat))
+
+
+def make_not(child: Optional[Node]) -> Optional[Node]:
+    if child is None:
+        return None
+    return child.child if isinstance(child, Not) else Not(child)
+
+
+class Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> Optional[Node]:
+        node = self.or_expr()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f"Unexpected '{self.tokens[self.pos][1]}'")
+        return node
+
+    def or_expr(self) -> Optional[Node]:
+        operands = [self.and_expr()]
+        while self.peek() == "OR":
+            self.take()
+            operands.append(self.and_expr())
+        return make_group(Or, operands)
+
+    def and_expr(self) -> Optional[Node]:
+        operands = [self.not_expr()]
+        while self.peek() in ("AND", "NOT", "LPAREN", "PHRASE", "WORD"):
+            if self.peek() == "AND":
+                self.take()
+            operands.append(self.not_expr())
+        return make_group(And, operands)
+
+    def not_expr(self) -> Optional[Node]:
+        if self.peek() == "NOT":
+            self.take()
+            return make_not(self.not_expr())
+        return self.primary()
+
+    def primary(self) -> Optional[Node]:
+        kind = self.peek()
+        if kind is None:
+            raise QuerySyntaxError("Query ends where a search term was expected")
+        _, text = self.take()
+        if kind == "LPAREN":
+            node = self.or_expr()
+            if self.peek() != "RPAREN":
+                raise QuerySyntaxError("Missing closing parenthesis")
+            self.take()
+            return node
+        if kind in ("PHRASE", "WORD"):
+            return make_term(text)
+        raise QuerySyntaxError(f"Unexpected '{text}'")
+
+
+def parse_query(query: str) -> Optional[Node]:
+    """Parse a query into a normalized AST, or None when no operand has a searchable term
+    (e.g. only stopwords). Raises QuerySyntaxError for malformed queries."""
+    return Parser(tokenize(query)).parse()
+
+
+def canonical(node: Node) -> str:
+    """Text form of an AST that is the same for every equivalent ordering of AND/OR operands"""
+    if isinstance(node, Term):
+        return node.tokens[0] if len(node.tokens) == 1 else '"' + " ".join(node.tokens) + '"'
+    if isinstance(node, Not):
+        return f"NOT {canonical(node.child)}"
+    operator = "AND" if isinstance(node, And) else "OR"
+    return f"({operator} " + " ".join(sorted(canonical(child) for child in node.children)) + ")"
+
+
+def query_terms(node: Node, negated: bool = False) -> Iterable[Tuple[Term, bool]]:
+    """Yield every Term of the AST with whether it sits under a NOT"""
+    if isinstance(node, Term):
+        yield node, negated
+    elif isinstance(node, Not):
+        yield from query_terms(node.child, not negated)
+    else:
+        for child in node.children:
+            yield from query_terms(child, negated)
+
+
+def positive_terms(node: Node) -> List[str]:
+    """Tokens a matching CV is rewarded for containing, i.e. those not under a NOT"""
+    return [token for term, negated in query_terms(node) if not negated for token in term.tokens]
+
+
+def expand_fuzzy(node: Node, negated: bool = False,
+                 variants: Optional[Dict[str, Tuple[str, float]]] = None) -> Tuple[Node, Dict[str, Tuple[str, float]]]:
+    """Replace every single-token Term outside a NOT by an OR of its indexed fuzzy variants.
+
+    Phrases and negated terms stay exact. Also returns, for each variant added, the query token
+    it stands for and the share of that token's score it earns.
+    """
+    if variants is None:
+        variants = {}
+    if isinstance(node, Term):
+        if negated or len(node.tokens) > 1:
+            return node, variants
+        token = node.tokens[0]
+        terms = []
+        for variant, weight in fuzzy.expand(token):
+            if variant != token:
+                variants.setdefault(variant, (token, weight))
+            terms.append(Term((variant,)))
+        return make_group(Or, terms), variants
+    if isinstance(node, Not):
+        return Not(expand_fuzzy(node.child, not negated, variants)[0]), variants
+    children = [expand_fuzzy(child, negated, variants)[0] for child in node.children]
+    return make_group(type(node), children), variants
+
+
+def estimated_size(node: Node, postings_by_term: PostingsByTerm) -> float:
+    """Upper bound on the number of CVs a node matches; negations are treated as unbounded"""
+    if isinstance(node, Term):
+        return min(len(postings_by_term.get(token, ())) for token in node.tokens)
+    if isinstance(node, Not):
+        return float("inf")
+    sizes = [estimated_size(child, postings_by_term) for child in node.children]
+    return min(sizes) if isinstance(node, And) else sum(sizes)
+
+
+def plan(node: Node, postings_by_term: PostingsByTerm) -> Node:
+    """Order the operands of every AND by selectivity, most selective first, so that each later
+    operand only has to check the CVs left over and evaluation stops as soon as none are.
+    NOTs, being unbounded, always come last and only ever subtract from the candidates."""
+    if isinstance(node, Term):
+        return node
+    if isinstance(node, Not):
+        return Not(plan(node.child, postings_by_term))
+    children = [plan(child, postings_by_term) for child in node.children]
+    if isinstance(node, And):
+        children.sort(key=lambda child: estimated_size(child, postings_by_term))
+    return type(node)(tuple(children))
+
+
+def execute(node: Node, postings_by_term: PostingsByTerm, candidates: Optional[Set[ObjectId]] = None,
+            universe: Callable[[], Set[ObjectId]] = indexed_cv_ids) -> Set[ObjectId]:
+    """CV ids matching a planned AST, restricted to `candidates` when given.
+
+    `universe` supplies every indexed CV and is only called when a NOT has nothing to subtract
+    from, i.e. for a query that is purely negative.
+    """
+    if isinstance(node, Term):
+        if len(node.tokens) > 1:
+            return match_phrase(list(node.tokens), postings_by_term, candidates)
+        posting_list = postings_by_term.get(node.tokens[0], {})
+        if candidates is None:
+            return set(posting_list)
+        return {cv_id for cv_id in candidates if cv_id in posting_list}
+    if isinstance(node, Not):
+        base = candidates if candidates is not None else universe()
+        return base - execute(node.child, postings_by_term, base, universe)
+    if isinstance(node, And):
+        matched = candidates
+        for child in node.children:
+            matched = execute(child, postings_by_term, matched, universe)
+            if not matched:
+                return set()
+        return matched
+
+    matched = set()
+    for child in node.children:
+        matched |= execute(child, postings_by_term, candidates, universe)
+        if candidates is not None and len(matched) == len(candidates):
+            break
+    return matched
+
+
+def search(node: Node) -> Tuple[Set[ObjectId], PostingsByTerm]:
+    """Answer a parsed query from the postings with one batched posting-list load.
+
+    Returns the matching CV ids and the posting lists that were loaded, so callers can rank
+    without another round trip.
+    """
+    terms = [term for term, _ in query_terms(node)]
+    with_positions = any(len(term.tokens) > 1 for term in terms)
+    postings_by_term = fetch_postings([token for term in terms for token in term.tokens], with_positions=with_positions)
+    return execute(plan(node, postings_by_term), postings_by_term), postings_by_term
@@ -0,0 +1,255 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.db.mongodb import db
+
+# Every term that has postings, with the number of CVs containing it: {"_id": term, "df"}
+vocabulary = db.cv_vocabulary
+# Seconds between checks of the index change log for terms indexed or removed by other workers
+FUZZY_SYNC_INTERVAL = float(os.getenv("FUZZY_SYNC_INTERVAL", "5"))
+# Most variants a query term is expanded to, closest and most frequent first
+FUZZY_MAX_EXPANSIONS = int(os.getenv("FUZZY_MAX_EXPANSIONS", "5"))
+# Share of a term's score a variant at edit distance 1 earns; the share is squared at distance 2
+FUZZY_VARIANT_WEIGHT = float(os.getenv("FUZZY_VARIANT_WEIGHT", "0.8"))
+# Term length from which 1 and 2 edits are allowed; shorter terms only match exactly
+FUZZY_ONE_EDIT_LENGTH = 4
+FUZZY_TWO_EDITS_LENGTH = 7
+GRAM_SIZE = 3
+
+
+def max_edits(term: str) -> int:
+    if len(term) >= FUZZY_TWO_EDITS_LENGTH:
+        return 2
+    return 1 if len(term) >= FUZZY_ONE_EDIT_LENGTH else 0
+
+
+def trigrams(term: str) -> set:
+    padded = f"${term}$"
+    return {padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> Optional[int]:
+    """Edit distance between a and b, counting a swap of adjacent characters as one edit (optimal
+    string alignment), or None as soon as it is known to exceed `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit and min(previous) > limit:
+            return None
+        before, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+class TrigramIndex:
+    """Character trigram postings over a term vocabulary.
+
+    An edit changes at most GRAM_SIZE + 1 of a term's padded trigrams (a swap touches one more
+    than an insertion, deletion or substitution), so a term within k edits of the query shares
+    at least len(trigrams(query)) - (GRAM_SIZE + 1) * k of them. Candidates are counted from
+    the posting lists of the query's own trigrams only, filtered on that bound and on length,
+    and just the survivors get an exact (bounded) edit distance check. A short query can lose
+    all of its trigrams to k edits ("acbd" shares none with "abcd"), so when the bound drops to
+    zero the terms of every length within k are scanned instead.
+
+    Terms no longer in any CV keep their id with a df of 0 and are skipped, so removals never
+    have to touch the posting lists.
+    """
+
+    def __init__(self, terms: Iterable[Tuple[str, int]] = ()):
+        self.terms: List[str] = []
+        self.df: List[int] = []
+        self.ids: Dict[str, int] = {}
+        self.grams: Dict[str, List[int]] = defaultdict(list)
+        self.lengths: Dict[int, List[int]] = defaultdict(list)
+        # Last index change applied (see sync) and when the change log was last read
+        self.seq = 0
+        self.synced_at = 0.0
+        self.add(terms)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def add(self, terms: Iterable[Tuple[str, int]]):
+        """Add (term, df) pairs; known terms only get their df raised"""
+        for term, df in terms:
+            term_id = self.ids.get(term)
+            if term_id is not None:
+                self.df[term_id] += df
+                continue
+            term_id = len(self.terms)
+            self.ids[term] = term_id
+            self.terms.append(term)
+            self.df.append(df)
+            for gram in trigrams(term):
+                self.grams[gram].append(term_id)
+            self.lengths[len(term)].append(term_id)
+
+    def update(self, term_dfs: Dict[str, int]):
+        """Set the df of each term, adding unknown ones; a df of 0 or less drops the term"""
+        for term, df in term_dfs.items():
+            term_id = self.ids.get(term)
+            if term_id is not None:
+                self.df[term_id] = max(df, 0)
+            elif df > 0:
+                self.add([(term, df)])
+
+    def similar(self, term: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(term, distance) pairs of the vocabulary terms within max_edits(term) of `term`,
+        closest first, then most frequent; the term itself is included when present"""
+        edits = max_edits(term)
+        if edits == 0:
+            term_id = self.ids.get(term)
+            return [(term, 0)] if term_id is not None and self.df[term_id] > 0 else []
+        query_grams = trigrams(term)
+        min_shared = len(query_grams) - (GRAM_SIZE + 1) * edits
+        if min_shared > 0:
+            shared = defaultdict(int)
+            for gram in query_grams:
+                for term_id in self.grams.get(gram, ()):
+                    shared[term_id] += 1
+            candidates = (term_id for term_id, count in shared.items() if count >= min_shared)
+        else:
+            candidates = (term_id for length in range(len(term) - edits, len(term) + edits + 1)
+                          for term_id in self.lengths.get(length, ()))
+
+        matches = []
+        for term_id in candidates:
+            if self.df[term_id] <= 0:
+                continue
+            candidate = self.terms[term_id]
+            distance = bounded_edit_distance(term, candidate, edits)
+            if distance is not None:
+                matches.append((distance, -self.df[term_id], candidate))
+        matches.sort()
+        return [(candidate, distance) for distance, _, candidate in matches[:limit]]
+
+
+def build() -> TrigramIndex:
+    """Load the index from cv_vocabulary, positioned at the change log entry current beforehand"""
+    from app.utils import indexer
+
+    seq = indexer.last_change()
+    index = TrigramIndex((entry["_id"], entry["df"]) for entry in vocabulary.find({"df": {"$gt": 0}}, {"df": 1}))
+    index.seq = seq
+    index.synced_at = time.monotonic()
+    return index
+
+
+def sync(index: TrigramIndex) -> bool:
+    """Apply logged index changes by re-reading the df of every term they touched. Returns False
+    when the index has to be rebuilt instead."""
+    from app.utils import indexer
+
+    if time.monotonic() - index.synced_at > indexer.INDEX_CHANGES_TTL / 2:
+        return False
+    touched = set()
+    seq = index.seq
+    for change in indexer.changes_since(seq):
+        if change["_id"] != seq + 1 and datetime.utcnow() - change["at"] < indexer.CHANGE_GAP_WAIT:
+            # An earlier change may still be being written; pick this one up next time
+            break
+        if change["op"] == "reset":
+            return False
+        touched.update(change.get("terms", ()))
+        seq = change["_id"]
+    if touched:
+        term_dfs = dict.fromkeys(touched, 0)
+        for entry in vocabulary.find({"_id": {"$in": list(touched)}}, {"df": 1}):
+            term_dfs[entry["_id"]] = entry["df"]
+        index.update(term_dfs)
+    index.seq = seq
+    index.synced_at = time.monotonic()
+    return True
+
+
+_index: Optional[TrigramIndex] = None
+_rebuilding = False
+# Held while the index is changed; searches read it without waiting
+_lock = threading.Lock()
+
+
+def _rebuild():
+    global _index, _rebuilding
+    try:
+        _index = build()
+    except Exception as e:
+        print(f"Could not rebuild the fuzzy vocabulary index: {e}")
+    finally:
+        _rebuilding = False
+
+
+def trigram_index() -> TrigramIndex:
+    """The process-wide trigram index, kept in step with the index change log.
+
+    Only the first call waits for the vocabulary to load. Afterwards one caller every
+    FUZZY_SYNC_INTERVAL seconds applies the latest changes while the others go on with the index
+    as it is. When the index has to be rebuilt (after a reindex, or once too far behind the log)
+    a background thread loads a new one and swaps it in.
+    """
+    global _index, _rebuilding
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = build()
+        return _index
+    index = _index
+    if time.monotonic() - index.synced_at > FUZZY_SYNC_INTERVAL and not _rebuilding and _lock.acquire(blocking=False):
+        try:
+            if index is _index and not _rebuilding and not sync(index):
+                _rebuilding = True
+                threading.Thread(target=_rebuild, daemon=True).start()
+        finally:
+            _lock.release()
+    return index
+
+
+def add_terms(term_counts: Dict[str, int]):
+    """Record newly indexed terms, as {term: number of CVs added that contain it}"""
+    if not term_counts:
+        return
+    vocabulary.bulk_write(
+        [UpdateOne({"_id": term}, {"$inc": {"df": count}}, upsert=True) for term, count in term_counts.items()],
+        ordered=False
+    )
+    # Make them searchable in this process right away; other workers pick them up on sync
+    if _index is not None:
+        with _lock:
+            _index.add(term_counts.items())
+
+
+def remove_terms(terms: List[str]):
+    """Record that one CV containing each of the terms was removed"""
+    if not terms:
+        return
+    vocabulary.update_many({"_id": {"$in": terms}}, {"$inc": {"df": -1}})
+    vocabulary.delete_many({"_id": {"$in": terms}, "df": {"$lte": 0}})
+
+
+def clear():
+    global _index
+    vocabulary.delete_many({})
+    _index = None
+
+
+def expand(term: str) -> List[Tuple[str, float]]:
+    """(variant, weight) pairs a query term is searched as: the term itself, at full weight,
+    and up to FUZZY_MAX_EXPANSIONS indexed variants within max_edits(term)"""
+    expansions = [(term, 1.0)]
+    for variant, distance in trigram_index().similar(term, FUZZY_MAX_EXPANSIONS + 1):
+        if variant != term and len(expansions) <= FUZZY_MAX_EXPANSIONS:
+            expansions.append((variant, FUZZY_VARIANT_WEIGHT ** distance))
+    return expansions
@@ -0,0 +1,353 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import marisa_trie
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.getenv("TALEND_DATA_DIR", BACKEND_DIR)
+
+# Source lists the gazetteers are compiled from
+NAMES_CSV = os.getenv("NAMES_CSV", os.path.join(DATA_DIR, "paired_full_names.csv"))
+NAMES_LIMIT = 50000
+SKILLS_FILE = os.getenv("SKILLS_FILE", os.path.join(DATA_DIR, "LINKEDIN_SKILLS_ORIGINAL.txt"))
+TITLES_FILE = os.getenv("TITLES_FILE", os.path.join(DATA_DIR, "titles_combined.txt"))
+COLLEGES_CSV = os.getenv("COLLEGES_CSV", os.path.join(DATA_DIR, "world-universities.csv"))
+SOURCE_FILES = {"names": NAMES_CSV, "skills": SKILLS_FILE, "titles": TITLES_FILE, "colleges": COLLEGES_CSV}
+
+# Where the compiled, memory-mappable artifacts live
+GAZETTEER_DIR = os.getenv("GAZETTEER_DIR", os.path.join(DATA_DIR, "gazetteers"))
+ARTIFACT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def is_word_char(ch: str) -> bool:
+    """Same definition of a word character as the re module's \\w for str patterns."""
+    return ch.isalnum() or ch == '_'
+
+
+def regex_boundary(prev_is_word: bool, next_is_word: bool) -> bool:
+    """A \\b position: the characters on either side differ in word-ness."""
+    return prev_is_word != next_is_word
+
+
+def token_boundary(prev_is_word: bool, next_is_word: bool) -> bool:
+    """Any position that does not split a word, so phrases may start or end on punctuation."""
+    return not (prev_is_word and next_is_word)
+
+
+BOUNDARIES = {"regex": regex_boundary, "token": token_boundary}
+
+
+def boundary_positions(text: str, boundary=regex_boundary) -> List[int]:
+    """Return every position 0..len(text) where `boundary` holds, text edges counting as non-word."""
+    flags = [is_word_char(ch) for ch in text]
+    flags.append(False)
+    positions = []
+    prev = False
+    for i, current in enumerate(flags):
+        if boundary(prev, current):
+            positions.append(i)
+        prev = current
+    return positions
+
+
+class GazetteerIndex:
+    """Multi-phrase matcher over a fixed gazetteer.
+
+    A phrase matches at text[i:j] when both i and j are boundary positions, which with the
+    default `regex_boundary` is exactly `re.search(r'\\b' + re.escape(phrase) + r'\\b', text)`.
+    Besides the phrases, every prefix of a phrase that ends on one of its own boundaries is kept,
+    so a scan started at a text boundary stops as soon as the text stops spelling out some phrase.
+    A lookup therefore costs a single pass over the text, independent of the gazetteer size.
+
+    `phrases` may also be a dict mapping each phrase to a payload (e.g. a college's country and
+    URL), available afterwards through `payload()`.
+    """
+
+    def __init__(self, phrases: Iterable[str], boundary=regex_boundary):
+        self.boundary = boundary
+        self.payloads: Dict[str, object] = dict(phrases) if isinstance(phrases, dict) else {}
+        self.phrases: Set[str] = set()
+        self.prefixes: Set[str] = set()
+        self.max_length = 0
+        for phrase in phrases:
+            if not phrase:
+                continue
+            self.phrases.add(phrase)
+            self.max_length = max(self.max_length, len(phrase))
+            for end in boundary_positions(phrase, boundary):
+                if end:
+                    self.prefixes.add(phrase[:end])
+            self.prefixes.add(phrase)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def __contains__(self, phrase: str) -> bool:
+        return phrase in self.phrases
+
+    def is_prefix(self, candidate: str) -> bool:
+        return candidate in self.prefixes
+
+    def payload(self, phrase: str) -> Optional[object]:
+        return self.payloads.get(phrase)
+
+    def finditer(self, text: str) -> Iterable[Tuple[int, int, str]]:
+        """Yield (start, end, phrase) for every occurrence, ordered by start then end."""
+        positions = boundary_positions(text, self.boundary)
+        count = len(positions)
+        is_prefix = self.is_prefix
+        for a in range(count - 1):
+            start = positions[a]
+            limit = start + self.max_length
+            for b in range(a + 1, count):
+                end = positions[b]
+                if end > limit:
+                    break
+                candidate = text[start:end]
+                if not is_prefix(candidate):
+                    break
+                if candidate in self:
+                    yield start, end, candidate
+
+    def search(self, text: str) -> Optional[str]:
+        """Return the first phrase occurring in `text`, or None."""
+        for _, _, phrase in self.finditer(text):
+            return phrase
+        return None
+
+    def find_all(self, text: str) -> Set[str]:
+        """Return the set of distinct phrases occurring in `text`."""
+        return {phrase for _, _, phrase in self.finditer(text)}
+
+
+class TrieGazetteerIndex(GazetteerIndex):
+    """GazetteerIndex over a memory-mapped marisa trie instead of Python sets.
+
+    The trie answers both phrase membership and (character) prefix tests, which prunes a little
+    later than boundary prefixes but finds exactly the same matches. Payloads, if any, are kept
+    in a list indexed by the trie's key ids.
+    """
+
+    def __init__(self, trie: marisa_trie.Trie, boundary=regex_boundary, max_length: int = 0,
+                 payloads: Optional[List[object]] = None):
+        self.boundary = boundary
+        self.trie = trie
+        self.max_length = max_length
+        self.payload_list = payloads
+
+    def __len__(self) -> int:
+        return len(self.trie)
+
+    def __contains__(self, phrase: str) -> bool:
+        return phrase in self.trie
+
+    def is_prefix(self, candidate: str) -> bool:
+        return next(self.trie.iterkeys(candidate), None) is not None
+
+    def payload(self, phrase: str) -> Optional[object]:
+        if self.payload_list is None or phrase not in self.trie:
+            return None
+        return self.payload_list[self.trie[phrase]]
+
+
+class Gazetteers:
+    """The parser's lookup tables: name sets and the skill, title and college indexes"""
+
+    def __init__(self, first_names, last_names, skills: GazetteerIndex, titles: GazetteerIndex,
+                 colleges: GazetteerIndex):
+        self.first_names = first_names
+        self.last_names = last_names
+        self.skills = skills
+        self.titles = titles
+        self.colleges = colleges
+
+
+def read_lines(path: str) -> Set[str]:
+    with open(path, encoding='utf-8') as f:
+        return set(line.strip().lower() for line in f if line.strip())
+
+
+def read_names(path: str, limit: int = NAMES_LIMIT) -> Tuple[Set[str], Set[str]]:
+    """First and last names from the first `limit` rows of paired_full_names.csv"""
+    first_names, last_names = set(), set()
+    if not os.path.exists(path):
+        print(f"Names list not found at {path}; name checks will rely on the other heuristics")
+        return first_names, last_names
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in itertools.islice(csv.DictReader(f), limit):
+            if row.get('First Name'):
+                first_names.add(row['First Name'].lower())
+            if row.get('Last Name'):
+                last_names.add(row['Last Name'].lower())
+    return first_names, last_names
+
+
+def read_colleges(path: str) -> Dict[str, Dict[str, Optional[str]]]:
+    """College name -> {country, url} from world-universities.csv (country, college, url rows)"""
+    colleges = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            country, college, url = (row + ['', '', ''])[:3]
+            if college:
+                colleges.setdefault(college.lower(), {'country': country or None, 'url': url or None})
+    return colleges
+
+
+def load_sources() -> Gazetteers:
+    """Build the gazetteers in memory straight from the source lists"""
+    first_names, last_names = read_names(NAMES_CSV)
+    return Gazetteers(
+        first_names,
+        last_names,
+        GazetteerIndex(read_lines(SKILLS_FILE)),
+        GazetteerIndex(read_lines(TITLES_FILE), boundary=token_boundary),
+        GazetteerIndex(read_colleges(COLLEGES_CSV), boundary=token_boundary),
+    )
+
+
+def file_sha256(path: str) -> Optional[str]:
+    try:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+
+def source_fingerprints() -> Dict[str, Optional[str]]:
+    """sha256 of each source list (None when missing), kept in the manifest so edited lists get
+    recompiled"""
+    return {name: file_sha256(path) for name, path in SOURCE_FILES.items()}
+
+
+def replace_file(path: str, write: Callable[[str], None]):
+    """Have `write` fill a temporary file of this process's own next to `path`, then rename it
+    into place. Workers starting together may all build the artifacts, and none of them can
+    then expose a file another one is still writing."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        os.chmod(tmp_path, 0o644)
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json(data, indent: Optional[int] = None) -> Callable[[str], None]:
+    def write(path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+    return write
+
+
+def build_artifacts(out_dir: str = GAZETTEER_DIR) -> dict:
+    """Compile the source lists into marisa tries plus a manifest, replacing files atomically"""
+    os.makedirs(out_dir, exist_ok=True)
+    # Taken before reading, so a list edited during the build is recompiled on the next load
+    sources = source_fingerprints()
+    first_names, last_names = read_names(NAMES_CSV)
+    colleges = read_colleges(COLLEGES_CSV)
+    tables = {
+        "first_names": (first_names, None),
+        "last_names": (last_names, None),
+        "skills": (read_lines(SKILLS_FILE), "regex"),
+        "titles": (read_lines(TITLES_FILE), "token"),
+        "colleges": (colleges.keys(), "token"),
+    }
+
+    manifest = {"version": ARTIFACT_VERSION, "sources": sources, "tables": {}}
+    for name, (keys, boundary) in tables.items():
+        trie = marisa_trie.Trie(keys)
+        replace_file(os.path.join(out_dir, f"{name}.marisa"), trie.save)
+        manifest["tables"][name] = {
+            "count": len(trie),
+            "max_length": max((len(key) for key in keys), default=0),
+            "boundary": boundary,
+        }
+        if name == "colleges":
+            payloads = [None] * len(trie)
+            for college, key_id in trie.items():
+                payloads[key_id] = colleges[college]
+            replace_file(os.path.join(out_dir, "colleges.payloads.json"), write_json(payloads))
+
+    replace_file(os.path.join(out_dir, MANIFEST_FILE), write_json(manifest, indent=2))
+    return manifest
+
+
+def load_artifacts(artifact_dir: str = GAZETTEER_DIR) -> Optional[Gazetteers]:
+    """Memory-map compiled artifacts, or return None if they are missing or outdated: built by
+    another ARTIFACT_VERSION, or from source lists that have changed since. Lists missing here
+    do not count as changed, so artifacts can be shipped without their sources."""
+    try:
+        with open(os.path.join(artifact_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != ARTIFACT_VERSION:
+        return None
+    built_from = manifest.get("sources") or {}
+    for name, sha in source_fingerprints().items():
+        if sha is not None and built_from.get(name) != sha:
+            return None
+
+    tables = {}
+    for name in manifest["tables"]:
+        tables[name] = marisa_trie.Trie().mmap(os.path.join(artifact_dir, f"{name}.marisa"))
+    with open(os.path.join(artifact_dir, "colleges.payloads.json"), encoding="utf-8") as f:
+        college_payloads = json.load(f)
+
+    def index(name, payloads=None):
+        info = manifest["tables"][name]
+        return TrieGazetteerIndex(tables[name], BOUNDARIES[info["boundary"]], info["max_length"], payloads)
+
+    return Gazetteers(
+        tables["first_names"],
+        tables["last_names"],
+        index("skills"),
+        index("titles"),
+        index("colleges", college_payloads),
+    )
+
+
+_gazetteers: Optional[Gazetteers] = None
+_lock = threading.Lock()
+
+
+def gazetteers() -> Gazetteers:
+    """The process-wide gazetteers, loaded on first use.
+
+    Compiled artifacts are memory-mapped when present; otherwise they are built from the source
+    lists first, falling back to in-memory tables if GAZETTEER_DIR is not writable.
+    """
+    global _gazetteers
+    if _gazetteers is None:
+        with _lock:
+            if _gazetteers is None:
+                loaded = load_artifacts()
+                if loaded is None:
+                    try:
+                        build_artifacts()
+                        loaded = load_artifacts()
+                    except OSError as e:
+                        print(f"Could not build gazetteer artifacts in {GAZETTEER_DIR}: {e}")
+                _gazetteers = loaded or load_sources()
+    return _gazetteers
+
+
+if __name__ == "__main__":
+    built = build_artifacts()
+    for table, info in built["tables"].items():
+        print(f"{table:12s} {info['count']:>7d} entries")
+    print(f"Gazetteer artifacts written to {GAZETTEER_DIR}")
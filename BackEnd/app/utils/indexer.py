@@ -0,0 +1,235 @@
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.db.mongodb import db
+from app.utils import fuzzy, query_cache
+from app.utils.scorer import clean_and_tokenize
+from app.utils.text_store import get_texts, migrate
+
+# One document per (term, CV): {"term", "cv_id", "tf", "doc_len", "positions", "fields"}, where
+# "fields" lists the scored CV fields (skills, position, ...) whose stored token set has the term
+postings = db.cv_postings
+# Corpus-wide counters needed by BM25: {"_id": "corpus", "doc_count", "total_length"}, and the
+# last change sequence number: {"_id": "changes", "seq"}
+index_stats = db.index_stats
+# Ordered log of index changes, so every process can keep in-memory structures built from the
+# postings in step: {"_id": seq, "op": "add" | "remove" | "reset" | "semantic", "cv_ids",
+# "terms", "at"}, "terms" being the distinct terms of the CVs added or removed. "semantic" records
+# a rebuilt semantic index, which leaves the postings as they are; the sequence number doubles
+# as the query cache generation.
+index_changes = db.index_changes
+# Seconds changes are kept; a process that falls further behind rebuilds from the postings
+INDEX_CHANGES_TTL = int(os.getenv("INDEX_CHANGES_TTL", "86400"))
+# A gap in the change log younger than this is assumed to be a write still in flight
+CHANGE_GAP_WAIT = timedelta(seconds=5)
+REINDEX_BATCH_SIZE = 500
+
+
+def build_postings(text: str) -> Dict[str, List[int]]:
+    """Map every normalized term of the text to the token positions it occurs at"""
+    positions = defaultdict(list)
+    for position, term in enumerate(clean_and_tokenize(text)):
+        positions[term].append(position)
+    return dict(positions)
+
+
+def posting_entries(cv_id: ObjectId, text: str, field_tokens: Optional[Dict[str, List[str]]] = None) -> Tuple[List[dict], int]:
+    """Build the posting documents of one CV and return them with the CV's length in terms.
+
+    `field_tokens` are the stored token sets from build_field_tokens; their terms are tagged on
+    the postings so search can apply field weights without loading the CV.
+    """
+    term_positions = build_postings(text)
+    doc_len = sum(len(positions) for positions in term_positions.values())
+    term_fields = defaultdict(list)
+    for field, tokens in (field_tokens or {}).items():
+        for term in tokens:
+            term_fields[term].append(field)
+
+    entries = []
+    for term in term_positions.keys() | term_fields.keys():
+        positions = term_positions.get(term, [])
+        entry = {"term": term, "cv_id": cv_id, "tf": len(positions), "doc_len": doc_len, "positions": positions}
+        if term in term_fields:
+            entry["fields"] = term_fields[term]
+        entries.append(entry)
+    return entries, doc_len
+
+
+def log_change(op: str, cv_ids: Iterable[ObjectId] = (), terms: Iterable[str] = ()) -> int:
+    seq = index_stats.find_one_and_update(
+        {"_id": "changes"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )["seq"]
+    index_changes.insert_one({
+        "_id": seq, "op": op, "cv_ids": list(cv_ids), "terms": list(terms), "at": datetime.utcnow()
+    })
+    return seq
+
+
+def changes_since(seq: int) -> List[dict]:
+    """Logged changes after `seq`, oldest first"""
+    return list(index_changes.find({"_id": {"$gt": seq}}).sort("_id", 1))
+
+
+def last_change() -> int:
+    return (index_stats.find_one({"_id": "changes"}) or {}).get("seq", 0)
+
+
+def index_cvs(batch: Iterable[Tuple[ObjectId, str, Optional[Dict[str, List[str]]]]]) -> int:
+    """Write the postings of several (cv_id, text, field_tokens) CVs with one batched insert"""
+    entries = []
+    doc_count = 0
+    total_length = 0
+    term_counts = Counter()
+    cv_ids = []
+    for cv_id, text, field_tokens in batch:
+        cv_entries, doc_len = posting_entries(cv_id, text, field_tokens)
+        # remove_cv only finds CVs through their postings, so one without any is not counted
+        if not cv_entries:
+            continue
+        entries.extend(cv_entries)
+        term_counts.update(entry["term"] for entry in cv_entries)
+        cv_ids.append(cv_id)
+        doc_count += 1
+        total_length += doc_len
+    if entries:
+        postings.insert_many(entries, ordered=False)
+        fuzzy.add_terms(term_counts)
+    if doc_count:
+        index_stats.update_one(
+            {"_id": "corpus"},
+            {"$inc": {"doc_count": doc_count, "total_length": total_length}},
+            upsert=True
+        )
+        log_change("add", cv_ids, term_counts)
+        query_cache.invalidate()
+    return len(entries)
+
+
+def index_cv(cv_id: ObjectId, text: str, field_tokens: Optional[Dict[str, List[str]]] = None) -> int:
+    """Write the postings of one CV, returning the number of distinct terms indexed"""
+    return index_cvs([(cv_id, text, field_tokens)])
+
+
+def remove_cv(cv_id: ObjectId):
+    """Drop the postings of one CV. CVs never indexed (failed, queued or still processing) leave
+    the corpus counters and the change log untouched."""
+    entry = postings.find_one({"cv_id": cv_id}, {"doc_len": 1})
+    if entry is None:
+        return
+    terms = postings.distinct("term", {"cv_id": cv_id})
+    postings.delete_many({"cv_id": cv_id})
+    fuzzy.remove_terms(terms)
+    index_stats.update_one(
+        {"_id": "corpus"},
+        {"$inc": {"doc_count": -1, "total_length": -entry.get("doc_len", 0)}}
+    )
+    log_change("remove", [cv_id], terms)
+    query_cache.invalidate()
+
+
+def corpus_stats() -> Tuple[int, float]:
+    """Number of indexed CVs and their average length in terms"""
+    stats = index_stats.find_one({"_id": "corpus"}) or {}
+    doc_count = max(stats.get("doc_count", 0), 0)
+    total_length = max(stats.get("total_length", 0), 0)
+    return doc_count, (total_length / doc_count if doc_count else 0.0)
+
+
+def reindex_batch(cvs: List[dict]) -> int:
+    raw_texts = get_texts(cv["_id"] for cv in cvs)
+    index_cvs((cv["_id"], raw_texts.get(cv["_id"], ""), cv.get("field_tokens")) for cv in cvs)
+    return len(cvs)
+
+
+def reindex_all() -> int:
+    """Rebuild the postings of every stored CV, e.g. for CVs uploaded before the index existed"""
+    # CVs stored before the text store existed still embed their raw text
+    migrate()
+    postings.delete_many({})
+    index_stats.delete_one({"_id": "corpus"})
+    fuzzy.clear()
+    log_change("reset")
+    query_cache.invalidate()
+    count = 0
+    batch = []
+    for cv in db.cvs.find({}, {"field_tokens": 1}):
+        batch.append(cv)
+        if len(batch) == REINDEX_BATCH_SIZE:
+            count += reindex_batch(batch)
+            batch = []
+    return count + reindex_batch(batch)
+
+
+def fetch_postings(terms: Iterable[str], with_positions: bool = False) -> Dict[str, Dict[ObjectId, dict]]:
+    """Load the posting lists of the given terms as {term: {cv_id: posting}}"""
+    terms = list(set(terms))
+    result = {term: {} for term in terms}
+    if not terms:
+        return result
+    projection = {"_id": 0, "term": 1, "cv_id": 1, "tf": 1, "doc_len": 1, "fields": 1}
+    if with_positions:
+        projection["positions"] = 1
+    for entry in postings.find({"term": {"$in": terms}}, projection):
+        result[entry["term"]][entry["cv_id"]] = entry
+    return result
+
+
+def field_tokens_from_postings(postings_by_term: Dict[str, Dict[ObjectId, dict]], cv_ids: Set[ObjectId]) -> Dict[ObjectId, Dict[str, Set[str]]]:
+    """Rebuild, for each CV, the part of its field token sets made of the loaded terms.
+
+    This is all field_match_score needs, since it only intersects the fields with the query.
+    """
+    fields_by_cv = {cv_id: defaultdict(set) for cv_id in cv_ids}
+    for term, posting_list in postings_by_term.items():
+        for cv_id, posting in posting_list.items():
+            cv_fields = fields_by_cv.get(cv_id)
+            if cv_fields is None:
+                continue
+            if posting["tf"]:
+                cv_fields["raw_text"].add(term)
+            for field in posting.get("fields", ()):
+                cv_fields[field].add(term)
+    return fields_by_cv
+
+
+def match_phrase(tokens: List[str], postings_by_term: Dict[str, Dict[ObjectId, dict]],
+                 candidates: Optional[Set[ObjectId]] = None) -> Set[ObjectId]:
+    """CV ids containing the tokens as consecutive terms, restricted to `candidates` when given"""
+    lists = sorted((postings_by_term.get(token, {}) for token in tokens), key=len)
+    if candidates is None:
+        candidates = set(lists[0])
+    else:
+        candidates = {cv_id for cv_id in candidates if cv_id in lists[0]}
+    for posting_list in lists[1:]:
+        candidates &= posting_list.keys()
+        if not candidates:
+            return set()
+    if len(tokens) == 1:
+        return candidates
+
+    matched = set()
+    for cv_id in candidates:
+        following = [set(postings_by_term[token][cv_id]["positions"]) for token in tokens[1:]]
+        for start in postings_by_term[tokens[0]][cv_id]["positions"]:
+            if all(start + offset in term_positions for offset, term_positions in enumerate(following, 1)):
+                matched.add(cv_id)
+                break
+    return matched
+
+
+def indexed_cv_ids() -> Set[ObjectId]:
+    """Ids of every CV that has postings"""
+    return set(postings.distinct("cv_id"))
+
+
+if __name__ == "__main__":
+    from app.db.indexes import ensure_indexes
+
+    ensure_indexes()
+    print(f"Reindexed {reindex_all()} CVs")
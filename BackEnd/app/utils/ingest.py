@@ -0,0 +1,330 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from starlette.concurrency import run_in_threadpool
+
+from app.db.mongodb import db
+from app.utils import metrics, parse_cache, semantic, text_store
+from app.utils.indexer import index_cv, index_cvs, remove_cv
+from app.utils.scorer import build_field_tokens
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+MIN_TEXT_LENGTH = 50
+# Upper bound on CVs handed to a worker at once by parse_many
+PARSE_CHUNK_SIZE = int(os.getenv("PARSE_CHUNK_SIZE", "32"))
+# Times a job is retried on a fresh pool after a worker died under it
+POOL_RETRIES = 1
+# Workers are not forked from the server itself: it runs threads by the time the pool starts
+# (the MongoDB monitors, the threadpool, the fuzzy index rebuild), and a child forked then can
+# inherit a lock one of them held, a gazetteer or logging lock say, and hang on it. The
+# forkserver is a fresh single-threaded process that loads the parser's resources once
+# (FORKSERVER_PRELOAD); the workers forked from it share them copy-on-write.
+INGEST_START_METHOD = os.getenv(
+    "INGEST_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+)
+FORKSERVER_PRELOAD = ["app.utils.ingest_preload"]
+
+
+@dataclass
+class IngestJob:
+    # Only the stored file's path is queued, the worker reads it back, so a full queue holds
+    # no upload bytes
+    cv_id: ObjectId
+    path: str
+    file_type: str
+    original_name: str
+    # sha256 of the file, so the parse result can be cached for repeat uploads
+    content_hash: Optional[str] = None
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_queue: Optional[asyncio.Queue] = None
+_consumers: List[asyncio.Task] = []
+
+
+def _init_worker():
+    """Load spaCy and the gazetteers once per worker process instead of once per CV. A no-op in
+    workers forked from the preloaded forkserver."""
+    from app.utils.parser import load_resources
+
+    load_resources()
+
+
+def _new_executor() -> ProcessPoolExecutor:
+    context = multiprocessing.get_context(INGEST_START_METHOD)
+    if context.get_start_method() == "forkserver":
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return ProcessPoolExecutor(
+        max_workers=INGEST_WORKERS,
+        mp_context=context,
+        initializer=_init_worker
+    )
+
+
+def _replace_executor(broken: ProcessPoolExecutor):
+    """Swap a broken pool for a new one. Every job in flight on the broken pool fails with
+    BrokenProcessPool, so only the first of them to get here replaces it."""
+    global _executor
+    if _executor is broken:
+        print("An ingestion worker died, starting a new worker pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        _executor = _new_executor()
+
+
+async def run_in_pool(fn, *args):
+    """Run fn on the worker pool. When a worker dies (killed, or crashed in native code on a
+    malformed file) the pool is replaced and the call retried, up to POOL_RETRIES times."""
+    if _executor is None:
+        raise RuntimeError("Ingestion pipeline is not running")
+    loop = asyncio.get_running_loop()
+    for attempt in range(POOL_RETRIES + 1):
+        executor = _executor
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            _replace_executor(executor)
+            if attempt == POOL_RETRIES:
+                raise
+
+
+def extract_text(path: str, file_type: str) -> str:
+    from app.utils.parser import extract_text_from_docx, extract_text_from_pdf
+
+    if file_type == "pdf":
+        text = extract_text_from_pdf(path)
+    elif file_type == "docx":
+        text = extract_text_from_docx(path)
+    else:
+        raise ValueError("Unsupported file format")
+
+    if not text or len(text.strip()) < MIN_TEXT_LENGTH:
+        raise ValueError("Could not extract sufficient text from CV")
+    return text
+
+
+def parse_file(path: str, file_type: str, original_name: str) -> Tuple[dict, list]:
+    """Extract and parse one CV. Runs inside a worker process.
+
+    Returns the parsed data and the (stage, seconds) timings, for metrics.record_stages.
+    """
+    from app.utils.parser import parse_cv_enhanced
+
+    timer = metrics.StageTimer()
+    with timer.stage("extraction"):
+        text = extract_text(path, file_type)
+    return parse_cv_enhanced(text, file_name=original_name, timer=timer), timer.timings
+
+
+def parse_files(files: List[Tuple[str, str, str]]) -> Tuple[list, list]:
+    """Extract and parse a chunk of (path, file_type, original_name) CVs, batching the NLP stage.
+
+    Runs inside a worker process. Returns, per file, the parsed data or the exception raised,
+    and the (stage, seconds) timings of the whole chunk.
+    """
+    from app.utils.parser import parse_cv_enhanced, run_ner_batch
+
+    timer = metrics.StageTimer()
+    results = [None] * len(files)
+    extracted = []
+    for i, (path, file_type, original_name) in enumerate(files):
+        try:
+            with timer.stage("extraction"):
+                extracted.append((i, extract_text(path, file_type), original_name))
+        except Exception as e:
+            results[i] = e
+
+    started = time.perf_counter()
+    docs = list(run_ner_batch([text for _, text, _ in extracted]))
+    # The batch is timed as a whole; each CV is charged an equal share
+    if docs:
+        share = (time.perf_counter() - started) / len(docs)
+        timer.timings.extend([("nlp", share)] * len(docs))
+    for (i, text, original_name), doc in zip(extracted, docs):
+        try:
+            results[i] = parse_cv_enhanced(text, file_name=original_name, doc=doc, timer=timer)
+        except Exception as e:
+            results[i] = e
+    return results, timer.timings
+
+
+def parsed_fields(parsed_data: dict) -> dict:
+    """Fields written onto a CV document once it has been parsed. The raw text is not among
+    them, it goes to the text store, and neither are the name candidates only the parse cache
+    keeps."""
+    fields = parsed_data.copy()
+    raw_text = fields.pop("raw_text")
+    fields.pop("name_candidates", None)
+    fields.update({
+        "processing_status": "completed",
+        "processed_time": datetime.utcnow(),
+        "text_length": len(raw_text),
+        "field_tokens": build_field_tokens(
+            skills=parsed_data.get("skills"),
+            position=parsed_data.get("current_position"),
+            company=parsed_data.get("current_company"),
+            name=parsed_data.get("name"),
+            email=parsed_data.get("email")
+        )
+    })
+    return fields
+
+
+def discard_cvs(cv_ids: List[ObjectId]):
+    """Undo the text, semantic and index writes of CVs, so none of them stays searchable. Best
+    effort, as it runs while another error is being handled."""
+    for cv_id in cv_ids:
+        try:
+            remove_cv(cv_id)
+            text_store.delete_text(cv_id)
+            semantic.remove_cv(cv_id)
+        except Exception as e:
+            print(f"Could not undo the writes of CV {cv_id}: {e}")
+
+
+def store_parsed_cv(cv_id: ObjectId, parsed_data: dict, content_hash: Optional[str] = None,
+                    stored_filename: Optional[str] = None):
+    """Store the text of the queued CV, index it and cache its parse result by content hash, then
+    write the parse result onto its document. The completed status goes last, so a CV reported
+    completed is always searchable, and one whose indexing failed is marked failed instead, with
+    whatever was written for it undone."""
+    # The CV may have been deleted while it was waiting in the queue
+    if db.cvs.find_one({"_id": cv_id}, {"_id": 1}) is None:
+        return
+    update = parsed_fields(parsed_data)
+    try:
+        text_store.put_text(cv_id, parsed_data["raw_text"])
+        semantic.add_cvs([(cv_id, parsed_data, parsed_data["raw_text"])])
+        index_cv(cv_id, parsed_data["raw_text"], update["field_tokens"])
+        if content_hash:
+            parse_cache.store(content_hash, stored_filename, parsed_data)
+        result = db.cvs.update_one({"_id": cv_id}, {"$set": update})
+    except Exception:
+        # The caller marks the CV failed, which must not leave it searchable
+        discard_cvs([cv_id])
+        raise
+    if not result.matched_count:
+        # Deleted while it was being indexed, after its own cleanup ran
+        discard_cvs([cv_id])
+
+
+def insert_parsed_cvs(entries: List[Tuple[dict, dict]]) -> List[ObjectId]:
+    """Insert already parsed CVs, given as (metadata, parsed_data) pairs, with batched writes.
+
+    The documents are inserted as processing and only marked completed once indexed, or failed,
+    with their partial writes undone, if indexing raises.
+    """
+    docs = []
+    for metadata, parsed_data in entries:
+        doc = parsed_fields(parsed_data)
+        doc.update(metadata)
+        doc["processing_status"] = "processing"
+        docs.append(doc)
+    if not docs:
+        return []
+    cv_ids = db.cvs.insert_many(docs).inserted_ids
+    raw_texts = [parsed_data["raw_text"] for _, parsed_data in entries]
+    try:
+        text_store.put_texts(zip(cv_ids, raw_texts))
+        semantic.add_cvs((cv_id, parsed_data, parsed_data["raw_text"]) for cv_id, (_, parsed_data) in zip(cv_ids, entries))
+        index_cvs((cv_id, text, doc["field_tokens"]) for cv_id, text, doc in zip(cv_ids, raw_texts, docs))
+    except Exception as e:
+        discard_cvs(cv_ids)
+        db.cvs.update_many(
+            {"_id": {"$in": cv_ids}}, {"$set": {"processing_status": "failed", "processing_error": str(e)}}
+        )
+        raise
+    db.cvs.update_many({"_id": {"$in": cv_ids}}, {"$set": {"processing_status": "completed"}})
+    return cv_ids
+
+
+def set_status(cv_id: ObjectId, status: str, error: Optional[str] = None):
+    update = {"processing_status": status}
+    if error is not None:
+        update["processing_error"] = error
+    db.cvs.update_one({"_id": cv_id}, {"$set": update})
+
+
+async def _consume():
+    while True:
+        job = await _queue.get()
+        try:
+            await run_in_threadpool(set_status, job.cv_id, "processing")
+            parsed_data, timings = await run_in_pool(
+                parse_file, job.path, job.file_type, job.original_name
+            )
+            metrics.record_stages(timings)
+            await run_in_threadpool(
+                store_parsed_cv, job.cv_id, parsed_data, job.content_hash, os.path.basename(job.path)
+            )
+        except Exception as e:
+            await run_in_threadpool(set_status, job.cv_id, "failed", str(e))
+        finally:
+            _queue.task_done()
+
+
+async def parse_many(files: List[Tuple[str, str, str]]) -> list:
+    """Parse (path, file_type, original_name) files in parallel on the worker pool.
+
+    Files are split into one chunk per worker (at most PARSE_CHUNK_SIZE each) so every worker
+    batches its NLP stage. Returns one entry per file, either the parsed data or the exception
+    it raised.
+    """
+    if _executor is None:
+        raise RuntimeError("Ingestion pipeline is not running")
+    if not files:
+        return []
+    chunk_size = min(PARSE_CHUNK_SIZE, -(-len(files) // INGEST_WORKERS))
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    chunk_results = await asyncio.gather(
+        *(run_in_pool(parse_files, chunk) for chunk in chunks),
+        return_exceptions=True
+    )
+    results = []
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        if isinstance(chunk_result, Exception):
+            results.extend([chunk_result] * len(chunk))
+        else:
+            chunk_parsed, timings = chunk_result
+            metrics.record_stages(timings)
+            results.extend(chunk_parsed)
+    return results
+
+
+def enqueue(job: IngestJob):
+    """Queue a CV for parsing. Raises asyncio.QueueFull when the ingestion backlog is full."""
+    if _queue is None:
+        raise RuntimeError("Ingestion pipeline is not running")
+    _queue.put_nowait(job)
+
+
+def queue_size() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+
+async def start():
+    global _executor, _queue
+    _executor = _new_executor()
+    _queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    for _ in range(INGEST_WORKERS):
+        _consumers.append(asyncio.create_task(_consume()))
+
+
+async def stop():
+    global _executor, _queue
+    for task in _consumers:
+        task.cancel()
+    await asyncio.gather(*_consumers, return_exceptions=True)
+    _consumers.clear()
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+    _executor = None
+    _queue = None
@@ -0,0 +1,9 @@
+"""Imported by the ingestion forkserver (see ingest.INGEST_START_METHOD), so every process it
+forks starts with the parser's resources loaded and shares them copy-on-write."""
+import gc
+
+from app.utils.parser import load_resources
+
+load_resources()
+gc.collect()
+gc.freeze()
@@ -0,0 +1,198 @@
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Requests carrying this header (with any value) get a Server-Timing header listing their stages
+TRACE_HEADER = "X-Trace"
+# Trace every request and print each trace, not just those asking for it
+TRACE_ALL = os.getenv("METRICS_TRACE_ALL", "0") == "1"
+
+Labels = Tuple[str, ...]
+
+
+class Histogram:
+    """Latency histogram per label combination, rendered in the Prometheus text format"""
+
+    def __init__(self, name: str, help_text: str, label_names: Labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [per-bucket counts (the last one is +Inf), sum]
+        self.series: Dict[Labels, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float, count: int = 1):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += count
+            series[1] += value * count
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self.series.items())]
+        for labels, counts, total in series:
+            label_text = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Labels):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series: Dict[Labels, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            label_text = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, labels))
+            lines.append(f"{self.name}{{{label_text}}} {value}")
+        return lines
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+parse_stage_seconds = Histogram(
+    "cv_parse_stage_seconds", "Time spent in each stage of parsing a CV", ("stage",)
+)
+db_command_seconds = Histogram(
+    "mongodb_command_seconds", "Latency of MongoDB commands", ("collection", "command")
+)
+db_command_failures = Counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed", ("collection", "command")
+)
+REGISTRY = [parse_stage_seconds, db_command_seconds, db_command_failures]
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# (name, seconds) spans of the request being traced, if it is
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("metrics_trace", default=None)
+
+
+def start_trace():
+    """Collect the spans recorded from here on in the current context; returns a reset token"""
+    return _trace.set([])
+
+
+def end_trace(token) -> List[Tuple[str, float]]:
+    spans = _trace.get() or []
+    _trace.reset(token)
+    return spans
+
+
+def trace_spans() -> Optional[List[Tuple[str, float]]]:
+    """The list the current context's trace collects its spans in, or None when not tracing"""
+    return _trace.get()
+
+
+def add_span(name: str, seconds: float):
+    spans = _trace.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def server_timing(spans: Iterable[Tuple[str, float]]) -> str:
+    """Spans as a Server-Timing header value, summed per name, in milliseconds"""
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in spans:
+        total = totals.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+    return ", ".join(
+        f'{name.replace(" ", "_")};dur={seconds * 1000:.2f};desc="x{count}"' for name, (seconds, count) in totals.items()
+    )
+
+
+def observe_stage(stage: str, seconds: float, count: int = 1):
+    """Record `count` parses that each spent `seconds` in a stage"""
+    parse_stage_seconds.observe((stage,), seconds, count)
+    add_span(f"parse.{stage}", seconds * count)
+
+
+def record_stages(timings: Iterable[Tuple[str, float]]):
+    """Record stage timings measured elsewhere, e.g. returned by a worker process"""
+    for stage, seconds in timings:
+        observe_stage(stage, seconds)
+
+
+class StageTimer:
+    """Times parser stages, keeping the (stage, seconds) pairs so a worker process can hand them
+    back to the process that exposes the metrics. Used as `with timer.stage("skills"): ...`."""
+
+    def __init__(self, timings: Optional[List[Tuple[str, float]]] = None):
+        self.timings = timings if timings is not None else []
+        self.current: Optional[str] = None
+        self.started = 0.0
+
+    def stage(self, name: str) -> "StageTimer":
+        self.current = name
+        return self
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.append((self.current, time.perf_counter() - self.started))
+        return False
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo command listener recording the latency of every command by collection"""
+
+    def __init__(self):
+        # request id -> collection, between a command starting and finishing
+        self.collections: Dict[int, str] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self.collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self.record(event)
+
+    def failed(self, event):
+        labels = self.record(event)
+        db_command_failures.inc(labels)
+
+    def record(self, event) -> Labels:
+        labels = (self.collections.pop(event.request_id, ""), event.command_name)
+        seconds = event.duration_micros / 1e6
+        db_command_seconds.observe(labels, seconds)
+        add_span(f"db.{labels[0] or event.command_name}.{event.command_name}", seconds)
+        return labels
+
+
+command_metrics = CommandMetrics()
@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.db.mongodb import db
+from app.utils.parser import PARSER_VERSION
+from app.utils.text_store import compress_text, decompress_text
+
+# Parse results keyed by "<sha256 of the file>:<parser version>":
+# {"_id", "content_hash", "parser_version", "stored_filename", "parsed", "raw_text", "created_at"},
+# with the raw text kept compressed apart from the parsed fields
+parse_cache = db.parse_cache
+
+
+def cache_key(sha: str) -> str:
+    return f"{sha}:{PARSER_VERSION}"
+
+
+def unpack(entry: Optional[dict]) -> Optional[dict]:
+    """Put the raw text back into an entry's parse result"""
+    if entry is not None:
+        entry["parsed"]["raw_text"] = decompress_text(entry.pop("raw_text"))
+    return entry
+
+
+def lookup(sha: str) -> Optional[dict]:
+    """The cache entry for a file's hash under the current parser version, if any"""
+    return unpack(parse_cache.find_one({"_id": cache_key(sha)}))
+
+
+def lookup_many(hashes: Iterable[str]) -> Dict[str, dict]:
+    """Cache entries of several hashes with one query, as {hash: entry}"""
+    keys = [cache_key(sha) for sha in set(hashes)]
+    if not keys:
+        return {}
+    return {entry["content_hash"]: unpack(entry) for entry in parse_cache.find({"_id": {"$in": keys}})}
+
+
+def store_many(results: Iterable[Tuple[str, str, dict]]):
+    """Cache (hash, stored_filename, parsed_data) parse results, overwriting older entries"""
+    now = datetime.utcnow()
+    requests = [
+        UpdateOne({"_id": cache_key(sha)}, {"$set": {
+            "content_hash": sha,
+            "parser_version": PARSER_VERSION,
+            "stored_filename": stored_filename,
+            "parsed": {key: value for key, value in parsed_data.items() if key != "raw_text"},
+            "raw_text": compress_text(parsed_data["raw_text"]),
+            "created_at": now
+        }}, upsert=True)
+        for sha, stored_filename, parsed_data in results
+    ]
+    if requests:
+        parse_cache.bulk_write(requests, ordered=False)
+
+
+def store(sha: str, stored_filename: str, parsed_data: dict):
+    store_many([(sha, stored_filename, parsed_data)])
+
+
+def set_stored_filename(sha: str, stored_filename: str):
+    """Point a cache entry at another copy of the file, e.g. after the cached one was deleted"""
+    parse_cache.update_one({"_id": cache_key(sha)}, {"$set": {"stored_filename": stored_filename}})
+
+
+def drop_stale() -> int:
+    """Remove entries written by other parser versions"""
+    return parse_cache.delete_many({"parser_version": {"$ne": PARSER_VERSION}}).deleted_count
+
+
+if __name__ == "__main__":
+    print(f"Removed {drop_stale()} stale parse cache entries")
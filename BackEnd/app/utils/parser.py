@@ -1,14 +1,14 @@
 import docx
 import re
-import spacy
-from typing import List, Dict, Optional, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple, Union
 import json
 import os
-from spacy.matcher import PhraseMatcher, Matcher
 from datetime import datetime
 import dateutil.parser as date_parser
-import pandas as pd
 import fitz  # pymupdf
+from app.utils.gazetteer import gazetteers
+from app.utils.metrics import StageTimer, record_stages
+from app.utils.segmenter import CVSegments, as_segments
 
 COMPANY_INDICATORS = [
     'technologies', 'tech', 'systems', 'solutions', 'services', 'consulting', 'labs', 'corporation',
@@ -16,21 +16,33 @@ COMPANY_INDICATORS = [
     'partners', 'ventures', 'studios', 'digital', 'software', 'pvt', 'private'
 ]
 
-nlp = spacy.load("en_core_web_sm")
-
-# Load external datasets
-NAMES_DF = pd.read_csv('C:/Users/tanay/Desktop/Data/College/Summer25/TalEnd/BackEnd/paired_full_names.csv', nrows=50000)
-FIRST_NAMES_SET = set(NAMES_DF['First Name'].dropna().str.lower())
-LAST_NAMES_SET = set(NAMES_DF['Last Name'].dropna().str.lower())
-
-with open('C:/Users/tanay/Desktop/Data/College/Summer25/TalEnd/BackEnd/LINKEDIN_SKILLS_ORIGINAL.txt', encoding='utf-8') as f:
-    SKILLS_SET = set(line.strip().lower() for line in f if line.strip())
-
-with open('C:/Users/tanay/Desktop/Data/College/Summer25/TalEnd/BackEnd/titles_combined.txt', encoding='utf-8') as f:
-    TITLES_SET = set(line.strip().lower() for line in f if line.strip())
-
-COLLEGE_DF = pd.read_csv('C:/Users/tanay/Desktop/Data/College/Summer25/TalEnd/BackEnd/world-universities.csv', header=None, names=['country', 'college', 'url'])
-COLLEGE_SET = set(COLLEGE_DF['college'].dropna().str.lower())
+# Bump whenever a change to the parser alters its output, so cached parse results are not reused
+PARSER_VERSION = "3"
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+# Only the NER component is read (for PERSON entities). In the trained pipelines it carries its
+# own tok2vec, so everything else can stay unloaded.
+SPACY_EXCLUDE = [c.strip() for c in os.getenv(
+    "SPACY_EXCLUDE", "tok2vec,tagger,parser,attribute_ruler,lemmatizer,senter"
+).split(",") if c.strip()]
+# Names sit at the top of a CV, so NER only runs over this many leading characters
+NER_HEADER_CHARS = int(os.getenv("NER_HEADER_CHARS", "1000"))
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "32"))
+
+_nlp = None
+
+def get_nlp():
+    """The spaCy pipeline, loaded on first use so importing the parser stays cheap"""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+    return _nlp
+
+def load_resources():
+    """Load the NLP model and gazetteers up front, e.g. when a worker process starts"""
+    gazetteers()
+    get_nlp()
 
 FORBIDDEN_NAMES = {"chatgpt", "resume", "cv", "profile", "curriculum vitae", "summary", "objective"}
 
@@ -44,12 +56,24 @@ def load_indian_names_from_file(file_path: str) -> Dict[str, List[str]]:
         print(f"Could not load names from {file_path}: {e}")
     return {}
 
+def header_text(text: str) -> str:
+    """Leading part of the CV handed to NER, cut at a line break where possible"""
+    if len(text) <= NER_HEADER_CHARS:
+        return text
+    cut = text.rfind('\n', 0, NER_HEADER_CHARS)
+    return text[:cut] if cut > 0 else text[:NER_HEADER_CHARS]
+
+def run_ner(text: str):
+    """Run the NLP stage over the header of one CV"""
+    return get_nlp()(header_text(text))
+
+def run_ner_batch(texts: List[str], batch_size: int = NER_BATCH_SIZE):
+    """Run the NLP stage over the headers of many CVs with nlp.pipe, yielding docs in order"""
+    return get_nlp().pipe((header_text(text) for text in texts), batch_size=batch_size)
+
 def extract_text_from_pdf(file_path: str) -> str:
-    text = ""
-    doc = fitz.open(file_path)
-    for page in doc:
-        text += page.get_text("text") or ""
-    doc.close()
+    with fitz.open(file_path) as doc:
+        text = "".join(page.get_text("text") or "" for page in doc)
     return text.strip()
 
 def extract_text_from_docx(file_path: str) -> str:
@@ -87,81 +111,84 @@ def extract_phone_numbers(text: str) -> List[str]:
     
     return list(set(cleaned_phones))
 
-def extract_name_enhanced(text: str, doc=None, file_name: Optional[str] = None) -> Optional[str]:
-    """Extract name by checking file name, first line, first two words, first 8 lines, spaCy NER, and email. If a name appears in 2+ sources (allowing for subset matches), return it. Filters out generic/forbidden names."""
-    if doc is None:
-        doc = nlp(text)
-    lines = text.split('\n')
-    candidates = []
-
-    # Helper to normalize names
-    def norm(name):
-        return ' '.join(name.strip().split()).title() if name else None
-
-    # Helper to check forbidden names (robust)
-    def is_forbidden(name):
-        if not name:
+def normalize_name(name: Optional[str]) -> Optional[str]:
+    return ' '.join(name.strip().split()).title() if name else None
+
+def is_forbidden_name(name: Optional[str]) -> bool:
+    """Empty names and generic words such as "resume" are never taken for a name"""
+    if not name:
+        return True
+    name_norm = name.strip().lower().replace(" ", "")
+    for forbidden in FORBIDDEN_NAMES:
+        forbidden_norm = forbidden.replace(" ", "").lower()
+        if name_norm == forbidden_norm:
             return True
-        name_norm = name.strip().lower().replace(" ", "")
-        for forbidden in FORBIDDEN_NAMES:
-            forbidden_norm = forbidden.replace(" ", "").lower()
-            if name_norm == forbidden_norm:
-                return True
-        return False
+    return False
 
-    # 0. File name
-    file_name_candidate = None
-    if file_name:
-        base = os.path.splitext(os.path.basename(file_name))[0]
-        file_name_words = re.split(r'[^A-Za-z]+', base)
-        file_name_words = [w for w in file_name_words if w]
-        if 2 <= len(file_name_words) <= 4:
-            first_name_valid = file_name_words[0].lower() in FIRST_NAMES_SET
-            last_name_valid = file_name_words[-1].lower() in LAST_NAMES_SET
-            if first_name_valid or last_name_valid:
-                if all(word.isalpha() and word[0].isupper() for word in file_name_words):
-                    file_name_candidate = ' '.join(file_name_words)
-                    candidate_norm = norm(file_name_candidate)
-                    if not is_forbidden(candidate_norm):
-                        candidates.append(candidate_norm)
+def file_name_candidate(file_name: Optional[str]) -> Optional[str]:
+    """Name spelled out by the file name (e.g. "Priya_Sharma_CV.pdf"), if any"""
+    if not file_name:
+        return None
+    gaz = gazetteers()
+    base = os.path.splitext(os.path.basename(file_name))[0]
+    file_name_words = re.split(r'[^A-Za-z]+', base)
+    file_name_words = [w for w in file_name_words if w]
+    if 2 <= len(file_name_words) <= 4:
+        first_name_valid = file_name_words[0].lower() in gaz.first_names
+        last_name_valid = file_name_words[-1].lower() in gaz.last_names
+        if first_name_valid or last_name_valid:
+            if all(word.isalpha() and word[0].isupper() for word in file_name_words):
+                candidate_norm = normalize_name(' '.join(file_name_words))
+                if not is_forbidden_name(candidate_norm):
+                    return candidate_norm
+    return None
+
+def text_name_candidates(text: Union[str, CVSegments], doc=None, emails: Optional[List[str]] = None) -> List[str]:
+    """Name candidates found in the CV itself: first line, first two words, first 8 lines, spaCy
+    NER and email, in that order"""
+    segments = as_segments(text)
+    if doc is None:
+        doc = run_ner(segments.text)
+    gaz = gazetteers()
+    lines = segments.lines
+    candidates = []
 
     # 1. First line
     first_line_candidate = None
     if lines:
-        first_line = lines[0].strip()
+        first_line = lines[0]
         first_line_words = first_line.split()
         if 2 <= len(first_line_words) <= 4:
-            first_name_valid = first_line_words[0].lower() in FIRST_NAMES_SET
-            last_name_valid = first_line_words[-1].lower() in LAST_NAMES_SET
+            first_name_valid = first_line_words[0].lower() in gaz.first_names
+            last_name_valid = first_line_words[-1].lower() in gaz.last_names
             if first_name_valid or last_name_valid:
                 if all(word.isalpha() and word[0].isupper() for word in first_line_words):
                     first_line_candidate = first_line
-                    candidate_norm = norm(first_line_candidate)
-                    if not is_forbidden(candidate_norm):
+                    candidate_norm = normalize_name(first_line_candidate)
+                    if not is_forbidden_name(candidate_norm):
                         candidates.append(candidate_norm)
 
     # 2. First two words
     first_two_candidate = None
-    words = text.split()
+    words = segments.words(2)
     if len(words) >= 2:
         first_two = words[:2]
         # More permissive: if both are alphabetic and title-cased, accept as candidate
         if all(word.isalpha() and word.istitle() for word in first_two):
             first_two_candidate = ' '.join(first_two)
-            candidate_norm = norm(first_two_candidate)
-            if not is_forbidden(candidate_norm):
+            candidate_norm = normalize_name(first_two_candidate)
+            if not is_forbidden_name(candidate_norm):
                 candidates.append(candidate_norm)
         # Bonus: if both are in names set, even if not title-cased
-        elif first_two[0].lower() in FIRST_NAMES_SET and first_two[1].lower() in LAST_NAMES_SET:
+        elif first_two[0].lower() in gaz.first_names and first_two[1].lower() in gaz.last_names:
             first_two_candidate = ' '.join(first_two)
-            candidate_norm = norm(first_two_candidate)
-            if not is_forbidden(candidate_norm):
+            candidate_norm = normalize_name(first_two_candidate)
+            if not is_forbidden_name(candidate_norm):
                 candidates.append(candidate_norm)
 
     # 3. First 8 lines (heuristics)
     heuristics_candidate = None
     for i, line in enumerate(lines[:8]):
-        line = line.strip()
         if not line or len(line) < 3:
             continue
         skip_patterns = [
@@ -175,12 +202,12 @@ def extract_name_enhanced(text: str, doc=None, file_name: Optional[str] = None)
         words = line.split()
         if 2 <= len(words) <= 4:
             if all(word.isalpha() and word.istitle() for word in words):
-                if (words[0].lower() in FIRST_NAMES_SET or 
-                    words[-1].lower() in LAST_NAMES_SET or
+                if (words[0].lower() in gaz.first_names or 
+                    words[-1].lower() in gaz.last_names or
                     i < 3):
                     heuristics_candidate = line
-                    candidate_norm = norm(heuristics_candidate)
-                    if not is_forbidden(candidate_norm):
+                    candidate_norm = normalize_name(heuristics_candidate)
+                    if not is_forbidden_name(candidate_norm):
                         candidates.append(candidate_norm)
                     break
 
@@ -191,22 +218,28 @@ def extract_name_enhanced(text: str, doc=None, file_name: Optional[str] = None)
             if not any(word.lower() in ['university', 'college', 'institute', 'company'] 
                       for word in ent.text.split()):
                 ner_candidate = ent.text.strip()
-                candidate_norm = norm(ner_candidate)
-                if not is_forbidden(candidate_norm):
+                candidate_norm = normalize_name(ner_candidate)
+                if not is_forbidden_name(candidate_norm):
                     candidates.append(candidate_norm)
                 break
 
     # 5. Email
     email_candidate = None
-    emails = extract_emails(text)
+    if emails is None:
+        emails = extract_emails(segments.text)
     if emails:
         name_from_email = extract_name_from_email(emails[0])
         if name_from_email:
             email_candidate = name_from_email
-            candidate_norm = norm(email_candidate)
-            if not is_forbidden(candidate_norm):
+            candidate_norm = normalize_name(email_candidate)
+            if not is_forbidden_name(candidate_norm):
                 candidates.append(candidate_norm)
 
+    return candidates
+
+def choose_name(candidates: List[Optional[str]]) -> Optional[str]:
+    """If a name appears in 2+ candidates (allowing for subset matches), return it, otherwise the
+    first candidate. Filters out generic/forbidden names."""
     # Improved consensus: treat names as matching if one is a contiguous subsequence of the other
     from collections import Counter
     def is_subsequence(short, long):
@@ -218,7 +251,7 @@ def extract_name_enhanced(text: str, doc=None, file_name: Optional[str] = None)
                 return True
         return False
 
-    filtered_candidates = [c for c in candidates if c and not is_forbidden(c)]
+    filtered_candidates = [c for c in candidates if c and not is_forbidden_name(c)]
     if not filtered_candidates:
         return None
     # Count matches by subsequence
@@ -231,20 +264,38 @@ def extract_name_enhanced(text: str, doc=None, file_name: Optional[str] = None)
             if is_subsequence(cand_i, cand_j) or is_subsequence(cand_j, cand_i):
                 match_counts[cand_i] += 1
     # If any candidate matches with at least one other, return the longest such candidate (not forbidden)
-    consensus_candidates = [c for c, count in match_counts.items() if count >= 1 and not is_forbidden(c)]
+    consensus_candidates = [c for c, count in match_counts.items() if count >= 1 and not is_forbidden_name(c)]
     for name in sorted(consensus_candidates, key=lambda x: len(x.split()), reverse=True):
-        if name and not is_forbidden(name):
+        if name and not is_forbidden_name(name):
             return name
     # Otherwise, return the first non-empty candidate that is not forbidden
     for name in filtered_candidates:
-        if name and not is_forbidden(name):
+        if name and not is_forbidden_name(name):
             return name
     return None
 
+def pick_name(file_name: Optional[str], candidates: List[str]) -> Optional[str]:
+    """The CV's name from the file name and the candidates found in its text"""
+    from_file_name = file_name_candidate(file_name)
+    return choose_name(([from_file_name] if from_file_name else []) + candidates)
+
+def extract_name_enhanced(text: Union[str, CVSegments], doc=None, file_name: Optional[str] = None,
+                          emails: Optional[List[str]] = None) -> Optional[str]:
+    """Extract name by checking file name, first line, first two words, first 8 lines, spaCy NER, and email. If a name appears in 2+ sources (allowing for subset matches), return it. Filters out generic/forbidden names."""
+    return pick_name(file_name, text_name_candidates(text, doc, emails))
+
+def with_file_name(parsed_data: dict, file_name: Optional[str]) -> dict:
+    """A parse result as it comes out for the same content uploaded as `file_name`: the name is
+    picked again, the file name being one of its sources"""
+    parsed_data = dict(parsed_data)
+    parsed_data["name"] = pick_name(file_name, parsed_data["name_candidates"])
+    return parsed_data
+
 def extract_name_from_email(email: str) -> Optional[str]:
     """Derive a name from an email address using paired_full_names.csv"""
     if not email:
         return None
+    gaz = gazetteers()
     try:
         local_part = email.split('@')[0]
         name_part = re.sub(r'[\._\d\-]', ' ', local_part)
@@ -252,9 +303,9 @@ def extract_name_from_email(email: str) -> Optional[str]:
         words = [word.capitalize() for word in name_part.split() if len(word) > 1]
         # Try to match first and last names from dataset
         for i in range(len(words)-1):
-            if words[i].lower() in FIRST_NAMES_SET and words[i+1].lower() in LAST_NAMES_SET:
+            if words[i].lower() in gaz.first_names and words[i+1].lower() in gaz.last_names:
                 return f"{words[i]} {words[i+1]}"
-        if words and words[0].lower() in FIRST_NAMES_SET:
+        if words and words[0].lower() in gaz.first_names:
             return words[0]
         if 2 <= len(words) <= 4:
             return ' '.join(words)
@@ -262,35 +313,30 @@ def extract_name_from_email(email: str) -> Optional[str]:
         return None
     return None
 
-def extract_skills_enhanced(text: str) -> List[str]:
+def extract_skills_enhanced(text: Union[str, CVSegments]) -> List[str]:
     """Extract skills using LINKEDIN_SKILLS_ORIGINAL.txt, matching only whole words."""
-    found_skills = set()
-    text_lower = text.lower()
-    for skill in SKILLS_SET:
-        pattern = r'\b' + re.escape(skill) + r'\b'
-        if re.search(pattern, text_lower):
-            found_skills.add(skill)
+    found_skills = gazetteers().skills.find_all(as_segments(text).lower)
     return list(found_skills)
 
-def extract_work_experience(text: str) -> Dict[str, any]:
+def experience_lines(segments: CVSegments) -> List[str]:
+    """Lines of the experience section, or of the whole CV if it has no experience heading"""
+    if segments.has_section("experience"):
+        return segments.section_lines("experience")
+    return segments.lines
+
+def find_experience_section(text: Union[str, CVSegments]) -> str:
+    """The experience section of a CV, or the whole text if no specific section is found"""
+    segments = as_segments(text)
+    if segments.has_section("experience"):
+        return segments.section_text("experience")
+    return segments.text
+
+def extract_work_experience(text: Union[str, CVSegments]) -> Dict[str, any]:
     """Extract detailed work experience information"""
     
-    # Pattern for experience sections
-    experience_section_patterns = [
-        r'(?:work\s+)?experience\s*:?\s*(.*?)(?=\n(?:education|skills|projects|certifications|\Z))',
-        r'professional\s+experience\s*:?\s*(.*?)(?=\n(?:education|skills|projects|certifications|\Z))',
-        r'employment\s+history\s*:?\s*(.*?)(?=\n(?:education|skills|projects|certifications|\Z))',
-    ]
-    
-    experience_text = ""
-    for pattern in experience_section_patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            experience_text = match.group(1)
-            break
-    
-    if not experience_text:
-        experience_text = text  # Use full text if no specific section found
+    segments = as_segments(text)
+    lines = experience_lines(segments)
+    experience_text = '\n'.join(lines)
     
     # Extract years of experience from various patterns
     years_patterns = [
@@ -312,7 +358,7 @@ def extract_work_experience(text: str) -> Dict[str, any]:
                 continue
     
     # Extract individual job entries
-    job_entries = extract_job_entries(experience_text)
+    job_entries = extract_job_entries(lines)
     
     # Calculate experience from job dates if not explicitly mentioned
     if not total_experience and job_entries:
@@ -323,15 +369,16 @@ def extract_work_experience(text: str) -> Dict[str, any]:
     return {
         'total_years': total_experience,
         'job_entries': job_entries,
-        'current_position': extract_current_position(text),
-        'current_company': extract_current_company(text, job_entries)
+        'current_position': extract_current_position(segments),
+        'current_company': extract_current_company(segments.text, job_entries)
     }
 
-def extract_job_entries(text: str) -> List[Dict[str, str]]:
-    """Extract individual job entries with dates, positions, and companies"""
+def extract_job_entries(text: Union[str, List[str]]) -> List[Dict[str, str]]:
+    """Extract individual job entries with dates, positions, and companies from a text or its stripped lines"""
     
     job_entries = []
-    lines = text.split('\n')
+    titles = gazetteers().titles
+    lines = as_segments(text).lines if isinstance(text, str) else text
     current_job = {}
     date_patterns = [
         r'(\d{4})\s*[-–]\s*(\d{4}|present|current)',
@@ -339,7 +386,6 @@ def extract_job_entries(text: str) -> List[Dict[str, str]]:
         r'(\d{1,2}/\d{4})\s*[-–]\s*(\d{1,2}/\d{4}|present|current)',
     ]
     for line in lines:
-        line = line.strip()
         if not line:
             if current_job:
                 job_entries.append(current_job)
@@ -357,11 +403,12 @@ def extract_job_entries(text: str) -> List[Dict[str, str]]:
                 break
         
         # Look for job titles
-        if any(title in line.lower() for title in TITLES_SET):
+        line_lower = line.lower()
+        if titles.search(line_lower):
             current_job['position'] = line
         
         # Look for company names
-        if any(indicator.lower() in line.lower() for indicator in COMPANY_INDICATORS):
+        if any(indicator in line_lower for indicator in COMPANY_INDICATORS):
             current_job['company'] = line
     
     if current_job:
@@ -412,13 +459,20 @@ def calculate_total_experience_from_jobs(job_entries: List[Dict[str, str]]) -> O
     
     return round(total_months / 12, 1) if total_months > 0 else None
 
-def extract_current_position(text: str) -> Optional[str]:
+def find_titles(line: str) -> List[str]:
+    """Return the job titles from titles_combined.txt found in a line, longest first"""
+    found = {}
+    for start, end, title in gazetteers().titles.finditer(line.lower()):
+        found.setdefault(title, start)
+    return sorted(found, key=lambda title: (-len(title), found[title]))
+
+def extract_current_position(text: Union[str, CVSegments]) -> Optional[str]:
     """Extract only the present designation using titles_combined.txt"""
-    lines = text.split('\n')
-    for line in lines:
-        for title in TITLES_SET:
-            if title in line.lower() and ('present' in line.lower() or 'current' in line.lower()):
-                return title.title()
+    for line_lower in as_segments(text).lower_lines:
+        if 'present' in line_lower or 'current' in line_lower:
+            titles = find_titles(line_lower)
+            if titles:
+                return titles[0].title()
     return None
 
 def extract_current_company(text: str, job_entries: List[Dict[str, str]]) -> Optional[str]:
@@ -445,31 +499,66 @@ def extract_current_company(text: str, job_entries: List[Dict[str, str]]) -> Opt
     
     return None
 
-def extract_education_enhanced(text: str) -> List[Dict[str, str]]:
-    """Extract education and check for college using world-universities.csv"""
+def extract_education_enhanced(text: Union[str, CVSegments]) -> List[Dict[str, str]]:
+    """Extract education and check for college using world-universities.csv, looking only at the
+    education section when the CV has one"""
     education_entries = []
-    lines = text.split('\n')
-    for line in lines:
-        for college in COLLEGE_SET:
-            if college in line.lower():
-                education_entries.append({'institution': college.title(), 'raw': line.strip()})
+    colleges = gazetteers().colleges
+    segments = as_segments(text)
+    section = "education" if segments.has_section("education") else None
+    lines = segments.section_lines(section) if section else segments.lines
+    lower_lines = segments.section_lines(section, lower=True) if section else segments.lower_lines
+    for line, line_lower in zip(lines, lower_lines):
+        for start, end, college in colleges.finditer(line_lower):
+            info = colleges.payload(college) or {}
+            education_entries.append({
+                'institution': college.title(),
+                'raw': line,
+                'country': info.get('country'),
+                'url': info.get('url'),
+            })
     return education_entries
 
-def parse_cv_enhanced(text: str, file_name: Optional[str] = None) -> dict:
-    """Enhanced CV parsing function with all improvements"""
-    doc = nlp(text)
+def parse_cv_enhanced(text: str, file_name: Optional[str] = None, doc=None, timer: Optional[StageTimer] = None) -> dict:
+    """Enhanced CV parsing function with all improvements. `doc` is the NER doc when already computed.
+
+    The time spent in each stage goes to `timer` when given (e.g. in a worker process, which hands
+    the timings back), otherwise straight to the parse stage metrics.
+    """
+    stages = timer or StageTimer()
+    if doc is None:
+        with stages.stage("nlp"):
+            doc = run_ner(text)
+    # Split the CV into lines and sections once; every extractor reads from these
+    segments = CVSegments(text)
+    with stages.stage("emails"):
+        emails = extract_emails(text)
+    with stages.stage("phones"):
+        phone_numbers = extract_phone_numbers(text)
+    with stages.stage("name"):
+        name_candidates = text_name_candidates(segments, doc, emails)
+        name = pick_name(file_name, name_candidates)
+    with stages.stage("skills"):
+        skills = extract_skills_enhanced(segments)
     # Extract work experience details
-    work_experience = extract_work_experience(text)
+    with stages.stage("experience"):
+        work_experience = extract_work_experience(segments)
+    with stages.stage("education"):
+        education = extract_education_enhanced(segments)
+    if timer is None:
+        record_stages(stages.timings)
     parsed_data = {
-        "name": extract_name_enhanced(text, doc, file_name=file_name),
-        "emails": extract_emails(text),
-        "phone_numbers": extract_phone_numbers(text),
-        "skills_by_category": extract_skills_enhanced(text),
+        "name": name,
+        # Kept with cached parse results so the name can be picked again for another file name
+        "name_candidates": name_candidates,
+        "emails": emails,
+        "phone_numbers": phone_numbers,
+        "skills_by_category": skills,
         "total_experience_years": work_experience['total_years'],
         "job_entries": work_experience['job_entries'],
         "current_position": work_experience['current_position'],
         "current_company": work_experience['current_company'],
-        "education": extract_education_enhanced(text),
+        "education": education,
         "raw_text": text
     }
     # Add flat skills list for backward compatibility
@@ -479,6 +568,14 @@ def parse_cv_enhanced(text: str, file_name: Optional[str] = None) -> dict:
     parsed_data['phone'] = parsed_data['phone_numbers'][0] if parsed_data['phone_numbers'] else None
     return parsed_data
 
+def parse_cvs_enhanced(texts: List[str], file_names: Optional[List[Optional[str]]] = None) -> List[dict]:
+    """Parse many CVs, batching the NLP stage through nlp.pipe"""
+    file_names = file_names or [None] * len(texts)
+    return [
+        parse_cv_enhanced(text, file_name=file_name, doc=doc)
+        for text, file_name, doc in zip(texts, file_names, run_ner_batch(texts))
+    ]
+
 def parse_cv(text: str, file_name: Optional[str] = None) -> dict:
     """Main CV parsing function - enhanced version"""
     return parse_cv_enhanced(text, file_name=file_name)
@@ -530,60 +627,12 @@ def test_cv_parser(sample_cv_text: str):
     return result
 
 def profile_parse_cv_enhanced(text: str, file_name: Optional[str] = None) -> dict:
-    """Profile each stage of the enhanced CV parsing function and print timings."""
-    import time
-    timings = {}
-    start = time.time()
-    doc = nlp(text)
-    timings['nlp'] = time.time() - start
-
-    t0 = time.time()
-    name = extract_name_enhanced(text, doc, file_name=file_name)
-    timings['name'] = time.time() - t0
-
-    t0 = time.time()
-    emails = extract_emails(text)
-    timings['emails'] = time.time() - t0
-
-    t0 = time.time()
-    phones = extract_phone_numbers(text)
-    timings['phones'] = time.time() - t0
-
-    t0 = time.time()
-    skills_by_category = extract_skills_enhanced(text)
-    timings['skills'] = time.time() - t0
-
-    t0 = time.time()
-    work_experience = extract_work_experience(text)
-    timings['work_experience'] = time.time() - t0
-
-    t0 = time.time()
-    education = extract_education_enhanced(text)
-    timings['education'] = time.time() - t0
-
-    total = time.time() - start
-    timings['total'] = total
-
+    """Parse a CV and print the time spent in each stage."""
+    timer = StageTimer()
+    parsed_data = parse_cv_enhanced(text, file_name=file_name, timer=timer)
     print("\n--- CV Parser Profiling ---")
-    for k, v in timings.items():
-        print(f"{k:20s}: {v:.4f} seconds")
+    for stage, seconds in timer.timings:
+        print(f"{stage:20s}: {seconds:.4f} seconds")
+    print(f"{'total':20s}: {sum(seconds for _, seconds in timer.timings):.4f} seconds")
     print("--------------------------\n")
-
-    parsed_data = {
-        "name": name,
-        "emails": emails,
-        "phone_numbers": phones,
-        "skills_by_category": skills_by_category,
-        "total_experience_years": work_experience['total_years'],
-        "job_entries": work_experience['job_entries'],
-        "current_position": work_experience['current_position'],
-        "current_company": work_experience['current_company'],
-        "education": education,
-        "raw_text": text
-    }
-    parsed_data['skills'] = list(set(parsed_data['skills_by_category']))
-    parsed_data['email'] = parsed_data['emails'][0] if parsed_data['emails'] else None
-    parsed_data['phone'] = parsed_data['phone_numbers'][0] if parsed_data['phone_numbers'] else None
     return parsed_data
-
-
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from app.db.mongodb import async_db, db
+
+# memory: per process LRU; mongo: entries shared by all workers; none: disabled
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+# Seconds the memory backend trusts the shared generation it last read; changes made by other
+# workers are seen within this delay, so a cache hit normally costs no database round trip
+QUERY_CACHE_GENERATION_REFRESH = float(os.getenv("QUERY_CACHE_GENERATION_REFRESH", "0.5"))
+
+
+class MemoryBackend:
+    """LRU of search responses with a TTL, local to the process.
+
+    The generation is the index change sequence every worker shares (see indexer.log_change),
+    so an upload or delete handled by any worker makes the responses cached here stale. It is
+    re-read at most every QUERY_CACHE_GENERATION_REFRESH seconds, and right after this process
+    changed the index itself.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL,
+                 refresh: float = QUERY_CACHE_GENERATION_REFRESH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.refresh = refresh
+        self.entries = OrderedDict()
+        self.current_generation = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    async def generation(self) -> int:
+        if self.current_generation is not None and time.monotonic() - self.checked_at < self.refresh:
+            return self.current_generation
+        entry = await async_db.index_stats.find_one({"_id": "changes"}, {"seq": 1})
+        seq = entry["seq"] if entry else 0
+        with self.lock:
+            self.checked_at = time.monotonic()
+            if seq != self.current_generation:
+                # Entries of older generations can never be read again
+                self.entries.clear()
+                self.current_generation = seq
+        return seq
+
+    def bump_generation(self):
+        # The change that invalidated the cache was already logged, moving the sequence; read
+        # it again on the next lookup
+        with self.lock:
+            self.entries.clear()
+            self.checked_at = 0.0
+
+    async def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: dict):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    async def size(self) -> int:
+        return len(self.entries)
+
+
+class MongoBackend:
+    """Search responses in the query_cache collection, shared by every worker and expired by a
+    TTL index on expires_at. The generation is a counter document in the same collection."""
+
+    name = "mongo"
+    GENERATION_ID = "generation"
+
+    def __init__(self, ttl: float = QUERY_CACHE_TTL):
+        self.ttl = ttl
+        self.collection = async_db.query_cache
+
+    async def generation(self) -> int:
+        entry = await self.collection.find_one({"_id": self.GENERATION_ID}, {"value": 1})
+        return entry["value"] if entry else 0
+
+    def bump_generation(self):
+        # Called from indexing code, which runs outside the event loop
+        db.query_cache.update_one({"_id": self.GENERATION_ID}, {"$inc": {"value": 1}}, upsert=True)
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        return entry["value"] if entry else None
+
+    async def set(self, key: str, value: dict):
+        await self.collection.replace_one(
+            {"_id": key},
+            {"value": value, "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)},
+            upsert=True
+        )
+
+    async def size(self) -> int:
+        return await self.collection.count_documents({"_id": {"$ne": self.GENERATION_ID}})
+
+
+BACKENDS = {"memory": MemoryBackend, "mongo": MongoBackend}
+backend = BACKENDS[QUERY_CACHE_BACKEND]() if QUERY_CACHE_BACKEND in BACKENDS else None
+stats = {"hits": 0, "misses": 0}
+
+
+def cache_key(canonical_query: str, limit: int, mode: str = "exact") -> str:
+    """Key of a parsed query, given in canonical form (boolean_query.canonical), where AND/OR
+    operand order and repeats don't matter. `mode` is exact, fuzzy or semantic."""
+    return "\x1f".join([mode, str(limit), canonical_query])
+
+
+async def get(key: str) -> Tuple[str, Optional[dict]]:
+    """Look up a query's cached response.
+
+    Also returns the key qualified with the index generation seen now, which is the key to store
+    a freshly computed response under: if the index changes meanwhile, that response is never served.
+    """
+    if backend is None:
+        return key, None
+    versioned_key = f"{await backend.generation()}:{key}"
+    value = await backend.get(versioned_key)
+    stats["hits" if value is not None else "misses"] += 1
+    return versioned_key, value
+
+
+async def put(versioned_key: str, value: dict):
+    if backend is not None:
+        await backend.set(versioned_key, value)
+
+
+def invalidate():
+    """Make every cached response stale; called whenever the search index changes"""
+    if backend is not None:
+        backend.bump_generation()
+
+
+async def cache_stats() -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        "backend": backend.name if backend is not None else None,
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+        "entries": await backend.size() if backend is not None else 0,
+        "generation": await backend.generation() if backend is not None else 0,
+    }
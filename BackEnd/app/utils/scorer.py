@@ -1,46 +1,110 @@
 import re
+import heapq
+import math
+from collections import defaultdict
+from operator import itemgetter
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 
 stop_words = set(stopwords.words('english'))
 
+# Query coverage of the raw text is worth up to this many points
+TEXT_MATCH_WEIGHT = 5.0
+# Field -> (points per matching query token, cap)
+FIELD_WEIGHTS = {
+    "skills": (0.5, 2.0),
+    "position": (0.5, 1.0),
+    "company": (0.5, 1.0),
+    "name": (1.0, 1.0),
+}
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
 def clean_and_tokenize(text: str):
     text = text.lower()
     text = re.sub(r"[^a-z0-9\s]", " ", text)
     tokens = word_tokenize(text)
     return [t for t in tokens if t not in stop_words and len(t) > 1]
 
-def compute_match_score(cv_text: str, query: str, skills=None, position=None, company=None, name=None, email=None) -> float:
+def build_field_tokens(text: Optional[str] = None, skills=None, position=None, company=None, name=None, email=None) -> Dict[str, List[str]]:
+    """Normalize each scored field once into a sorted, de-duplicated token list ready to be stored.
+
+    Name and email share the "name" field, as they only ever earned a single bonus together.
+    Fields that are empty are left out.
+    """
+    fields = {
+        "raw_text": text or '',
+        "skills": ' '.join(skills or []),
+        "position": position or '',
+        "company": company or '',
+        "name": f"{name or ''} {email or ''}",
+    }
+    field_tokens = {}
+    for field, value in fields.items():
+        tokens = sorted(set(clean_and_tokenize(value)))
+        if tokens:
+            field_tokens[field] = tokens
+    return field_tokens
+
+def field_match_score(query_tokens: Set[str], field_tokens: Dict[str, Iterable[str]]) -> float:
+    """Score a CV from the token sets of its fields: query coverage of the raw text plus capped field bonuses"""
+    if not query_tokens:
+        return 0.0
     score = 0.0
-    query_tokens = set(clean_and_tokenize(query))
-    cv_tokens = set(clean_and_tokenize(cv_text))
 
     # 1. Text match (Jaccard-based)
-    if query_tokens and cv_tokens:
-        intersection = len(query_tokens & cv_tokens)
-        jaccard_score = (intersection / len(query_tokens)) * 5  # Scale to 5
-        score += jaccard_score
-
-    # 2. Skill match
-    if skills:
-        skill_text = ' '.join(skills)
-        skill_tokens = set(clean_and_tokenize(skill_text))
-        match_count = len(query_tokens & skill_tokens)
-        score += min(2.0, match_count * 0.5)  # 0.5 per skill match
-
-    # 3. Position/Company
-    if position:
-        position_tokens = set(clean_and_tokenize(position))
-        score += min(1.0, len(query_tokens & position_tokens) * 0.5)
-
-    if company:
-        company_tokens = set(clean_and_tokenize(company))
-        score += min(1.0, len(query_tokens & company_tokens) * 0.5)
-
-    # 4. Bonus: name/email (rare)
-    bonus_fields = f"{name or ''} {email or ''}"
-    bonus_tokens = set(clean_and_tokenize(bonus_fields))
-    if query_tokens & bonus_tokens:
-        score += 1.0
+    text_tokens = field_tokens.get("raw_text")
+    if text_tokens:
+        intersection = len(query_tokens.intersection(text_tokens))
+        score += (intersection / len(query_tokens)) * TEXT_MATCH_WEIGHT
+
+    # 2. Skills, position, company and the name/email bonus
+    for field, (per_match, cap) in FIELD_WEIGHTS.items():
+        tokens = field_tokens.get(field)
+        if tokens:
+            score += min(cap, len(query_tokens.intersection(tokens)) * per_match)
 
     return round(min(score, 10.0), 2)
+
+def compute_match_score(cv_text: str, query: str, skills=None, position=None, company=None, name=None, email=None) -> float:
+    query_tokens = set(clean_and_tokenize(query))
+    field_tokens = build_field_tokens(cv_text, skills=skills, position=position, company=company, name=name, email=email)
+    return field_match_score(query_tokens, field_tokens)
+
+def bm25_idf(df: int, doc_count: int) -> float:
+    return math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+def bm25_scores(query_terms: Iterable[str], postings_by_term: Dict[str, Dict[Hashable, dict]],
+                doc_count: int, avg_doc_len: float, candidates: Optional[Set[Hashable]] = None,
+                weights: Optional[Dict[str, float]] = None) -> Dict[Hashable, float]:
+    """Score documents with Okapi BM25 from posting lists alone.
+
+    Each posting carries the term frequency (`tf`) and document length (`doc_len`) stored at
+    ingestion, and the document frequency is the length of the posting list, so the cost is one
+    step per posting touched. Only documents in `candidates` are scored when it is given, and
+    a term listed in `weights` contributes that fraction of its score.
+    """
+    scores = defaultdict(float)
+    doc_count = max(doc_count, 1)
+    avg_doc_len = avg_doc_len or 1.0
+    for term in set(query_terms):
+        posting_list = postings_by_term.get(term) or {}
+        if not posting_list:
+            continue
+        idf = bm25_idf(len(posting_list), max(doc_count, len(posting_list)))
+        if weights and term in weights:
+            idf *= weights[term]
+        for doc_id, posting in posting_list.items():
+            if candidates is not None and doc_id not in candidates:
+                continue
+            tf = posting["tf"]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * posting["doc_len"] / avg_doc_len)
+            scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+def top_k(scores: Dict[Hashable, float], k: int) -> List[Tuple[Hashable, float]]:
+    """The k best (doc_id, score) pairs, best first, without sorting the whole result set"""
+    return heapq.nlargest(k, scores.items(), key=itemgetter(1))
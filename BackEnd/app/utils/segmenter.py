@@ -0,0 +1,88 @@
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+# Heading text (lowercased, without punctuation) -> section label
+SECTION_HEADINGS = {
+    "experience": [
+        "experience", "work experience", "professional experience", "employment history", "employment",
+        "work history", "career history", "relevant experience", "internships", "internship experience",
+    ],
+    "education": [
+        "education", "academic background", "academics", "academic qualifications", "educational qualifications",
+        "qualifications", "education and training",
+    ],
+    "skills": [
+        "skills", "technical skills", "key skills", "core skills", "core competencies", "competencies",
+        "skills and tools", "technologies", "tools and technologies",
+    ],
+    "projects": ["projects", "academic projects", "personal projects", "key projects"],
+    "certifications": ["certifications", "certificates", "courses", "licenses and certifications"],
+    "summary": ["summary", "profile", "objective", "professional summary", "career objective", "about me"],
+}
+HEADING_LABELS = {heading: label for label, headings in SECTION_HEADINGS.items() for heading in headings}
+# Longer lines are content, even if they start with a heading word
+MAX_HEADING_LENGTH = 40
+HEADING_PUNCTUATION = re.compile(r"[^a-z& ]+")
+
+
+def heading_label(lower_line: str) -> Optional[Tuple[str, bool]]:
+    """The section a line opens, if it is a heading, and whether content follows it on the line
+    (e.g. "Skills: Python, SQL")"""
+    heading, colon, rest = lower_line.partition(":")
+    if len(heading) > MAX_HEADING_LENGTH:
+        return None
+    key = " ".join(HEADING_PUNCTUATION.sub(" ", heading.replace("&", " and ")).split())
+    label = HEADING_LABELS.get(key)
+    if label is None:
+        return None
+    return label, bool(colon and rest.strip())
+
+
+class CVSegments:
+    """A CV split once into stripped lines, with a lowercased view of the text and of every line,
+    and the line ranges of its labeled sections.
+
+    Lines before the first heading form the "header" section. A section whose heading appears
+    more than once covers all of its ranges, in order.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self.lines = [line.strip() for line in text.split('\n')]
+        self.lower_lines = [line.lower() for line in self.lines]
+        self.sections: Dict[str, List[Tuple[int, int]]] = {}
+
+        label, start = "header", 0
+        for i, lower_line in enumerate(self.lower_lines):
+            heading = heading_label(lower_line)
+            if heading is None:
+                continue
+            self.sections.setdefault(label, []).append((start, i))
+            label, inline = heading
+            start = i if inline else i + 1
+        self.sections.setdefault(label, []).append((start, len(self.lines)))
+
+    def has_section(self, label: str) -> bool:
+        return any(end > start for start, end in self.sections.get(label, ()))
+
+    def section_lines(self, label: str, lower: bool = False) -> List[str]:
+        lines = self.lower_lines if lower else self.lines
+        return [line for start, end in self.sections.get(label, ()) for line in lines[start:end]]
+
+    def section_text(self, label: str) -> str:
+        return "\n".join(self.section_lines(label))
+
+    def words(self, count: int) -> List[str]:
+        """The first `count` whitespace separated words of the text"""
+        words = []
+        for line in self.lines:
+            words.extend(line.split())
+            if len(words) >= count:
+                break
+        return words[:count]
+
+
+def as_segments(text: Union[str, CVSegments]) -> CVSegments:
+    """Segments of a CV given either as text or as already computed segments"""
+    return text if isinstance(text, CVSegments) else CVSegments(text)
@@ -0,0 +1,401 @@
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+from app.db.mongodb import db
+from app.utils import query_cache
+from app.utils.gazetteer import DATA_DIR
+from app.utils.indexer import log_change
+from app.utils.parser import find_experience_section
+from app.utils.scorer import clean_and_tokenize
+from app.utils.text_store import get_texts
+
+# The LSA model and the IVF index built with it live here together
+SEMANTIC_DIR = os.getenv("SEMANTIC_DIR", os.path.join(DATA_DIR, "semantic"))
+SEMANTIC_DIM = int(os.getenv("SEMANTIC_DIM", "128"))
+# The LSA vocabulary: the most frequent terms occurring in at least SEMANTIC_MIN_DF CVs
+SEMANTIC_MAX_TERMS = int(os.getenv("SEMANTIC_MAX_TERMS", "50000"))
+SEMANTIC_MIN_DF = 2
+# Inverted lists scanned per query; more is slower and closer to an exact scan
+SEMANTIC_NPROBE = int(os.getenv("SEMANTIC_NPROBE", "8"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+INDEX_VERSION = 1
+BUILD_BATCH_SIZE = 500
+META_FILE = "meta.json"
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on a file shared by processes: flock on POSIX, msvcrt.locking on Windows"""
+    with open(path, "a+b") as lock_file:
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return
+
+        import msvcrt
+        lock_file.seek(0)
+        while True:
+            try:
+                # Gives up with OSError after retrying for about 10 seconds
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                continue
+        try:
+            yield
+        finally:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def semantic_text(parsed_data: dict, raw_text: str) -> str:
+    """The part of a CV that is embedded: its experience section, job titles and skills"""
+    titles = [parsed_data.get("current_position") or ""]
+    titles += [job.get("position", "") for job in parsed_data.get("job_entries") or []]
+    return "\n".join([find_experience_section(raw_text or "")] + titles + list(parsed_data.get("skills") or []))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+class LSAModel:
+    """TF-IDF followed by a truncated SVD. Texts map to dense unit vectors in which terms that
+    occur in similar CVs lie close together, so related wording matches without shared words."""
+
+    def __init__(self, terms: List[str], idf: np.ndarray, components: np.ndarray):
+        self.terms = list(terms)
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.idf = idf.astype(np.float32)
+        self.components = components.astype(np.float32)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[1]
+
+    def tfidf(self, token_lists: List[List[str]]) -> sparse.csr_matrix:
+        """Rows of sublinear TF-IDF weights, scaled to unit length"""
+        rows, cols, data = [], [], []
+        for row, tokens in enumerate(token_lists):
+            counts = Counter(token for token in tokens if token in self.term_ids)
+            for term, count in counts.items():
+                rows.append(row)
+                cols.append(self.term_ids[term])
+                data.append((1 + math.log(count)) * self.idf[self.term_ids[term]])
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(token_lists), len(self.terms)), dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        return sparse.diags(1 / np.where(norms > 0, norms, 1)) @ matrix
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Unit vectors of the texts; a text with no known term maps to the zero vector"""
+        return normalize_rows(self.tfidf([clean_and_tokenize(text) for text in texts]) @ self.components)
+
+    @classmethod
+    def fit(cls, texts: List[str], dim: int = SEMANTIC_DIM) -> "LSAModel":
+        token_lists = [clean_and_tokenize(text) for text in texts]
+        df = Counter(term for tokens in token_lists for term in set(tokens))
+        terms = [term for term, count in df.most_common(SEMANTIC_MAX_TERMS) if count >= SEMANTIC_MIN_DF]
+        k = min(dim, len(texts) - 1, len(terms) - 1)
+        if k < 1:
+            raise ValueError("Not enough CVs to fit a semantic model")
+        idf = np.array([math.log((1 + len(texts)) / (1 + df[term])) + 1 for term in terms])
+        model = cls(terms, idf, np.zeros((len(terms), k)))
+        _, _, vt = svds(model.tfidf(token_lists).astype(np.float64), k=k)
+        model.components = vt.T.astype(np.float32)
+        return model
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(f, terms=np.array(self.terms), idf=self.idf, components=self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "LSAModel":
+        with np.load(path) as data:
+            return cls(data["terms"].tolist(), data["idf"], data["components"])
+
+
+def kmeans(vectors: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS) -> np.ndarray:
+    """Spherical k-means centroids of unit vectors, trained on a sample of at most KMEANS_SAMPLE"""
+    rng = np.random.default_rng(0)
+    if len(vectors) > KMEANS_SAMPLE:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_SAMPLE, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        # Reseed empty lists with random vectors so every list stays in use
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+class SemanticIndex:
+    """An LSA model and an inverted-file (IVF) index of the CV vectors embedded with it.
+
+    Vectors are clustered around `nlist` k-means centroids, and a query only compares against
+    the vectors of its SEMANTIC_NPROBE closest lists, so its cost grows with about sqrt(N)
+    rather than N. Vectors, CV ids and list assignments are .npy files, memory-mapped and
+    shared with every process using SEMANTIC_DIR. Adds append under a file lock (doubling the
+    files when full); deletes set the row's list to -1 in place, which readers see at once.
+    Each process keeps its per-list row arrays in memory and catches up on rows appended by
+    others when meta.json changes.
+    """
+
+    def __init__(self, directory: str = SEMANTIC_DIR):
+        self.directory = directory
+        self.meta: Optional[dict] = None
+        self.meta_stat = None
+        self.model: Optional[LSAModel] = None
+        self.list_rows: List[np.ndarray] = []
+        self.rows_by_id: Dict[bytes, int] = {}
+        self.lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def locked(self):
+        """Exclusive lock against writers in this and every other process"""
+        with self.lock, file_lock(self.path(".lock")):
+            yield
+
+    def write_meta(self, meta: dict):
+        with open(self.path(META_FILE + ".tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(self.path(META_FILE + ".tmp"), self.path(META_FILE))
+
+    def refresh(self) -> bool:
+        """Pick up changes made on disk since the last call; False when no index is built"""
+        try:
+            stat = os.stat(self.path(META_FILE))
+        except OSError:
+            return False
+        if self.meta is not None and (stat.st_mtime_ns, stat.st_size, stat.st_ino) == self.meta_stat:
+            return True
+        with open(self.path(META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            return False
+        old = self.meta
+        if old is None or (old["build_id"], old["capacity"]) != (meta["build_id"], meta["capacity"]):
+            self.open(meta, reload_model=old is None or old["build_id"] != meta["build_id"])
+        else:
+            self.add_rows(old["count"], meta["count"])
+        self.meta = meta
+        self.meta_stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        return True
+
+    def open(self, meta: dict, reload_model: bool):
+        if reload_model:
+            self.model = LSAModel.load(self.path("model.npz"))
+            self.centroids = np.load(self.path("centroids.npy"))
+        self.vectors = np.load(self.path("vectors.npy"), mmap_mode="r+")
+        self.ids = np.load(self.path("ids.npy"), mmap_mode="r+")
+        self.lists = np.load(self.path("lists.npy"), mmap_mode="r+")
+        self.list_rows = [np.zeros(0, dtype=np.int64) for _ in range(meta["nlist"])]
+        self.rows_by_id = {}
+        self.add_rows(0, meta["count"])
+
+    def add_rows(self, start: int, end: int):
+        """Add rows start..end of the files to the in-memory lists"""
+        if end <= start:
+            return
+        assignments = np.asarray(self.lists[start:end])
+        rows = np.arange(start, end)[assignments >= 0]
+        assignments = assignments[assignments >= 0]
+        order = np.argsort(assignments, kind="stable")
+        rows, assignments = rows[order], assignments[order]
+        boundaries = np.flatnonzero(np.diff(assignments)) + 1
+        for list_rows in np.split(rows, boundaries):
+            if len(list_rows):
+                list_id = self.lists[list_rows[0]]
+                self.list_rows[list_id] = np.concatenate([self.list_rows[list_id], list_rows])
+        for row in range(start, end):
+            self.rows_by_id[self.ids[row].tobytes()] = row
+
+    def search(self, text: str, k: int, nprobe: int = SEMANTIC_NPROBE) -> Optional[List[Tuple[ObjectId, float]]]:
+        """The k CVs closest to the text, as (cv_id, cosine similarity), or None when no index is built"""
+        with self.lock:
+            if not self.refresh():
+                return None
+            return self.nearest(self.model.embed([text])[0], k, nprobe)
+
+    def nearest(self, query: np.ndarray, k: int, nprobe: int) -> List[Tuple[ObjectId, float]]:
+        query = query.astype(np.float32)
+        if not query.any():
+            return []
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.list_rows[list_id] for list_id in probe])
+        rows = rows[self.lists[rows] >= 0]
+        if not len(rows):
+            return []
+        similarities = np.asarray(self.vectors[rows]) @ query
+        if len(rows) > k:
+            best = np.argpartition(-similarities, k - 1)[:k]
+            rows, similarities = rows[best], similarities[best]
+        order = np.argsort(-similarities, kind="stable")
+        return [(ObjectId(self.ids[row].tobytes()), float(similarities[i])) for i, row in zip(order, rows[order])]
+
+    def grow(self, capacity: int):
+        """Copy the files into ones with room for `capacity` rows"""
+        count = self.meta["count"]
+        for name, array in (("vectors.npy", self.vectors), ("ids.npy", self.ids), ("lists.npy", self.lists)):
+            grown = np.lib.format.open_memmap(self.path(name + ".tmp"), mode="w+", dtype=array.dtype,
+                                              shape=(capacity,) + array.shape[1:])
+            grown[:count] = array[:count]
+            grown.flush()
+            del grown
+            os.replace(self.path(name + ".tmp"), self.path(name))
+        self.meta = dict(self.meta, capacity=capacity)
+        self.open(self.meta, reload_model=False)
+
+    def add(self, cv_ids: List[ObjectId], texts: List[str]):
+        """Embed and add CVs, replacing the vectors of CVs already present"""
+        with self.locked():
+            if not self.refresh() or not cv_ids:
+                return
+            self.mark_removed(cv_ids)
+            vectors = self.model.embed(texts)
+            count = self.meta["count"]
+            if count + len(cv_ids) > self.meta["capacity"]:
+                self.grow(max(2 * self.meta["capacity"], count + len(cv_ids)))
+            end = count + len(cv_ids)
+            self.vectors[count:end] = vectors
+            self.ids[count:end] = np.frombuffer(b"".join(cv_id.binary for cv_id in cv_ids), dtype=np.uint8).reshape(-1, 12)
+            # A CV without any known term has nothing to be found by
+            self.lists[count:end] = np.where(vectors.any(axis=1), np.argmax(vectors @ self.centroids.T, axis=1), -1)
+            for array in (self.vectors, self.ids, self.lists):
+                array.flush()
+            self.add_rows(count, end)
+            self.meta = dict(self.meta, count=end)
+            self.write_meta(self.meta)
+
+    def mark_removed(self, cv_ids: Iterable[ObjectId]) -> bool:
+        removed = False
+        for cv_id in cv_ids:
+            row = self.rows_by_id.pop(cv_id.binary, None)
+            if row is not None:
+                self.lists[row] = -1
+                removed = True
+        if removed:
+            self.lists.flush()
+        return removed
+
+    def remove(self, cv_ids: List[ObjectId]):
+        with self.locked():
+            if self.refresh() and self.mark_removed(cv_ids):
+                self.meta = dict(self.meta, removed=self.meta.get("removed", 0) + 1)
+                self.write_meta(self.meta)
+
+    def build(self, model: LSAModel, cv_ids: List[ObjectId], vectors: np.ndarray):
+        """Replace the index with the given model and vectors"""
+        live = vectors.any(axis=1)
+        nlist = max(1, min(int(live.sum()), int(2 * math.sqrt(len(vectors)))))
+        centroids = kmeans(vectors[live], nlist) if live.any() else np.zeros((1, model.dim), dtype=np.float32)
+        capacity = max(1024, 2 * len(cv_ids))
+        staging = self.directory + ".building"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        model.save(os.path.join(staging, "model.npz"))
+        np.save(os.path.join(staging, "centroids.npy"), centroids)
+        arrays = {
+            "vectors.npy": (np.float32, (capacity, model.dim)),
+            "ids.npy": (np.uint8, (capacity, 12)),
+            "lists.npy": (np.int32, (capacity,)),
+        }
+        files = {name: np.lib.format.open_memmap(os.path.join(staging, name), mode="w+", dtype=dtype, shape=shape)
+                 for name, (dtype, shape) in arrays.items()}
+        count = len(cv_ids)
+        files["vectors.npy"][:count] = vectors
+        files["ids.npy"][:count] = np.frombuffer(b"".join(cv_id.binary for cv_id in cv_ids), dtype=np.uint8).reshape(-1, 12)
+        files["lists.npy"][:count] = np.where(live, np.argmax(vectors @ centroids.T, axis=1), -1)
+        for array in files.values():
+            array.flush()
+        del files
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self.locked():
+            for name in ["model.npz", "centroids.npy"] + list(arrays):
+                os.replace(os.path.join(staging, name), self.path(name))
+            self.write_meta({"version": INDEX_VERSION, "build_id": uuid.uuid4().hex, "dim": model.dim,
+                             "nlist": nlist, "count": count, "capacity": capacity})
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+_index = SemanticIndex()
+
+
+def search(text: str, k: int) -> Optional[List[Tuple[ObjectId, float]]]:
+    return _index.search(text, k)
+
+
+def add_cvs(items: Iterable[Tuple[ObjectId, dict, str]]):
+    """Embed (cv_id, parsed_data, raw_text) CVs into the index; a no-op until the index is built"""
+    items = list(items)
+    if items and os.path.exists(_index.path(META_FILE)):
+        _index.add([cv_id for cv_id, _, _ in items], [semantic_text(parsed, raw_text) for _, parsed, raw_text in items])
+
+
+def remove_cv(cv_id: ObjectId):
+    if os.path.exists(_index.path(META_FILE)):
+        _index.remove([cv_id])
+
+
+def stored_semantic_texts() -> Tuple[List[ObjectId], List[str]]:
+    """Semantic text of every parsed CV, rebuilt from the stored fields and text store"""
+    cv_ids, texts = [], []
+    projection = {"current_position": 1, "job_entries": 1, "skills": 1}
+    batch = []
+
+    def flush():
+        raw_texts = get_texts(cv["_id"] for cv in batch)
+        for cv in batch:
+            cv_ids.append(cv["_id"])
+            texts.append(semantic_text(cv, raw_texts.get(cv["_id"], "")))
+        batch.clear()
+
+    for cv in db.cvs.find({"processing_status": "completed"}, projection):
+        batch.append(cv)
+        if len(batch) == BUILD_BATCH_SIZE:
+            flush()
+    flush()
+    return cv_ids, texts
+
+
+def rebuild() -> int:
+    """Fit the LSA model on every parsed CV and rebuild the index from scratch"""
+    cv_ids, texts = stored_semantic_texts()
+    model = LSAModel.fit(texts)
+    _index.build(model, cv_ids, model.embed(texts))
+    # Moves the query cache generation in every worker, not just in this process
+    log_change("semantic")
+    query_cache.invalidate()
+    return len(cv_ids)
+
+
+if __name__ == "__main__":
+    print(f"Embedded {rebuild()} CVs into {SEMANTIC_DIR}")
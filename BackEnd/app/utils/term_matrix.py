@@ -0,0 +1,231 @@
+import math
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.utils import indexer
+from app.utils.fuzzy import vocabulary
+from app.utils.gazetteer import gazetteers
+from app.utils.scorer import BM25_B, BM25_K1, bm25_idf, clean_and_tokenize
+
+# Pending CVs are merged into the compressed matrix once they hold this share of its entries
+MERGE_RATIO = float(os.getenv("TERM_MATRIX_MERGE_RATIO", "0.1"))
+# Job description terms that are (part of) a known skill count this many times as much
+SKILL_TERM_BOOST = float(os.getenv("MATCH_SKILL_TERM_BOOST", "2.0"))
+LOAD_BATCH_SIZE = 10000
+
+
+def bm25_tf(tf: np.ndarray, doc_len: int, avg_doc_len: float) -> np.ndarray:
+    """The term frequency half of BM25, which only depends on the CV"""
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / (avg_doc_len or 1.0))
+    return tf * (BM25_K1 + 1) / (tf + norm)
+
+
+class TermMatrix:
+    """Sparse term x CV matrix of BM25 term-frequency weights, kept in step with the postings.
+
+    It is stored term-major (one CSR row per term), so scoring a weighted query only reads the
+    rows of the query's terms: scores = weights @ matrix[query_terms], one sparse product over
+    every CV at once. CVs indexed since the last merge sit in per-CV COO chunks next to the CSR
+    matrix and are scored from there; they are merged in once they hold MERGE_RATIO of the entries, so
+    an insertion costs amortized O(1). Removed CVs are masked out and dropped at the next merge.
+    The weights use the average CV length at the time a CV is added.
+    """
+
+    def __init__(self):
+        self.term_ids: Dict[str, int] = {}
+        self.cv_ids: List[Hashable] = []
+        self.columns: Dict[Hashable, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        # (term rows, column, weights) of each CV added since the last merge
+        self.pending_chunks: List[Tuple[np.ndarray, int, np.ndarray]] = []
+        self.pending_nnz = 0
+        self.seq = 0
+        self.synced_at = 0.0
+
+    def __len__(self) -> int:
+        return int(self.alive.sum())
+
+    def term_id(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.term_ids[term] = len(self.term_ids)
+        return term_id
+
+    def add_cv(self, cv_id: Hashable, term_tfs: List[Tuple[str, int]], doc_len: int, avg_doc_len: float):
+        """Add a CV from its (term, tf) pairs; a CV already present is left as it is"""
+        if cv_id in self.columns:
+            return
+        column = self.columns[cv_id] = len(self.cv_ids)
+        self.cv_ids.append(cv_id)
+        if column >= len(self.alive):
+            self.alive = np.concatenate([self.alive, np.zeros(max(len(self.alive), 1024), dtype=bool)])
+        self.alive[column] = True
+        term_tfs = [(term, tf) for term, tf in term_tfs if tf]
+        rows = np.fromiter((self.term_id(term) for term, _ in term_tfs), dtype=np.int64, count=len(term_tfs))
+        tfs = np.fromiter((tf for _, tf in term_tfs), dtype=np.float32, count=len(term_tfs))
+        self.pending_chunks.append((rows, column, bm25_tf(tfs, doc_len, avg_doc_len)))
+        self.pending_nnz += len(rows)
+
+    def pending(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows, columns and weights of the pending CVs as COO arrays"""
+        if not self.pending_chunks:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float32)
+        rows = np.concatenate([rows for rows, _, _ in self.pending_chunks])
+        cols = np.repeat([column for _, column, _ in self.pending_chunks], [len(rows) for rows, _, _ in self.pending_chunks])
+        data = np.concatenate([data for _, _, data in self.pending_chunks])
+        return rows, cols, data
+
+    def remove_cv(self, cv_id: Hashable):
+        column = self.columns.get(cv_id)
+        if column is not None:
+            self.alive[column] = False
+
+    def merge(self):
+        """Fold the pending CVs into the CSR matrix and drop removed CVs"""
+        shape = (len(self.term_ids), len(self.cv_ids))
+        matrix = self.matrix.copy()
+        matrix.resize(shape)
+        rows, cols, data = self.pending()
+        pending = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+        keep = np.flatnonzero(self.alive[:len(self.cv_ids)])
+        self.matrix = (matrix + pending)[:, keep].tocsr()
+        self.cv_ids = [self.cv_ids[column] for column in keep]
+        self.columns = {cv_id: column for column, cv_id in enumerate(self.cv_ids)}
+        self.alive = np.ones(len(self.cv_ids), dtype=bool)
+        self.pending_chunks = []
+        self.pending_nnz = 0
+
+    def scores(self, term_weights: Dict[str, float]) -> np.ndarray:
+        """Score of every CV column for a weighted query; removed CVs score 0"""
+        if self.pending_nnz > MERGE_RATIO * self.matrix.nnz:
+            self.merge()
+        scores = np.zeros(len(self.cv_ids), dtype=np.float32)
+        query = {self.term_ids[term]: weight for term, weight in term_weights.items() if term in self.term_ids}
+        if not query:
+            return scores
+
+        rows = np.fromiter(query.keys(), dtype=np.int64)
+        weights = np.fromiter(query.values(), dtype=np.float32)
+        in_matrix = rows < self.matrix.shape[0]
+        if in_matrix.any():
+            scores[:self.matrix.shape[1]] += self.matrix[rows[in_matrix]].T @ weights[in_matrix]
+        if self.pending_chunks:
+            pending_rows, pending_cols, pending_data = self.pending()
+            row_weights = np.zeros(len(self.term_ids), dtype=np.float32)
+            row_weights[rows] = weights
+            np.add.at(scores, pending_cols, row_weights[pending_rows] * pending_data)
+        scores[~self.alive[:len(scores)]] = 0
+        return scores
+
+    def top_k(self, term_weights: Dict[str, float], k: int) -> Tuple[List[Tuple[Hashable, float]], int]:
+        """The k best (cv_id, score) pairs, best first, and the number of CVs scoring above 0"""
+        scores = self.scores(term_weights)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        total = int(np.count_nonzero(scores > 0))
+        return [(self.cv_ids[column], float(scores[column])) for column in matched], total
+
+
+def load_postings(matrix: TermMatrix, query: Optional[dict] = None):
+    """Add the CVs whose postings match `query` (all of them by default), one CV at a time"""
+    _, avg_doc_len = indexer.corpus_stats()
+    terms_by_cv = {}
+    cursor = indexer.postings.find(query or {}, {"_id": 0, "term": 1, "cv_id": 1, "tf": 1, "doc_len": 1})
+    for entry in cursor.batch_size(LOAD_BATCH_SIZE):
+        cv = terms_by_cv.setdefault(entry["cv_id"], (entry["doc_len"], []))
+        cv[1].append((entry["term"], entry["tf"]))
+    for cv_id, (doc_len, term_tfs) in terms_by_cv.items():
+        matrix.add_cv(cv_id, term_tfs, doc_len, avg_doc_len)
+
+
+def build() -> TermMatrix:
+    """Load the matrix from the postings, positioned at the change log entry current beforehand"""
+    matrix = TermMatrix()
+    matrix.seq = indexer.last_change()
+    load_postings(matrix)
+    matrix.merge()
+    matrix.synced_at = time.monotonic()
+    return matrix
+
+
+def sync(matrix: TermMatrix) -> Optional[TermMatrix]:
+    """Apply logged index changes to the matrix. Returns None when it has to be rebuilt instead."""
+    if time.monotonic() - matrix.synced_at > indexer.INDEX_CHANGES_TTL / 2:
+        return None
+    added = []
+    for change in indexer.changes_since(matrix.seq):
+        if change["_id"] != matrix.seq + 1 and datetime.utcnow() - change["at"] < indexer.CHANGE_GAP_WAIT:
+            # An earlier change may still be being written; pick this one up next time
+            break
+        if change["op"] == "reset":
+            return None
+        if change["op"] == "add":
+            added.extend(change["cv_ids"])
+        elif change["op"] == "remove":
+            for cv_id in change["cv_ids"]:
+                matrix.remove_cv(cv_id)
+        matrix.seq = change["_id"]
+    if added:
+        # Postings of CVs removed since then are gone, so only live CVs come back
+        load_postings(matrix, {"cv_id": {"$in": added}})
+    matrix.synced_at = time.monotonic()
+    return matrix
+
+
+_matrix: Optional[TermMatrix] = None
+_lock = threading.Lock()
+
+
+def term_matrix() -> TermMatrix:
+    """The process-wide matrix, brought up to date with the change log. Callers hold _lock."""
+    global _matrix
+    if _matrix is not None:
+        _matrix = sync(_matrix)
+    if _matrix is None:
+        _matrix = build()
+    return _matrix
+
+
+def job_term_weights(job_description: str) -> Dict[str, float]:
+    """Weighted term vector of a job description: sublinear term frequency times the term's IDF
+    over the indexed CVs, boosted for terms of skills found in the text"""
+    counts = Counter(clean_and_tokenize(job_description))
+    if not counts:
+        return {}
+    skill_terms = {
+        term for skill in gazetteers().skills.find_all(job_description.lower()) for term in clean_and_tokenize(skill)
+    }
+    doc_count, _ = indexer.corpus_stats()
+    df = {entry["_id"]: entry["df"] for entry in vocabulary.find({"_id": {"$in": list(counts)}}, {"df": 1})}
+    weights = {}
+    for term, count in counts.items():
+        if df.get(term, 0) <= 0:
+            continue
+        weight = (1 + math.log(count)) * bm25_idf(df[term], max(doc_count, df[term]))
+        weights[term] = weight * (SKILL_TERM_BOOST if term in skill_terms else 1.0)
+    return weights
+
+
+def match_job_description(job_description: str, limit: int) -> Tuple[List[Tuple[Hashable, float]], int, Dict[str, float]]:
+    """Rank every indexed CV against a job description.
+
+    Returns the top (cv_id, score) pairs, the number of CVs sharing any weighted term with it and
+    the term weights used.
+    """
+    weights = job_term_weights(job_description)
+    if not weights:
+        return [], 0, weights
+    with _lock:
+        ranked, total = term_matrix().top_k(weights, limit)
+    return ranked, total, weights
@@ -0,0 +1,73 @@
+import os
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from app.db.mongodb import db
+
+# Raw CV text lives apart from the CV documents, compressed:
+# {"_id": cv_id, "codec": "zlib", "length": <characters>, "data": <compressed UTF-8>}
+texts = db.cv_texts
+COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", "6"))
+MIGRATE_BATCH_SIZE = 500
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress_text(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def text_entry(cv_id: ObjectId, text: str) -> dict:
+    return {"_id": cv_id, "codec": "zlib", "length": len(text), "data": compress_text(text)}
+
+
+def put_texts(items: Iterable[Tuple[ObjectId, str]]):
+    """Store the raw text of several (cv_id, text) CVs, replacing any previous text"""
+    requests = [ReplaceOne({"_id": cv_id}, text_entry(cv_id, text), upsert=True) for cv_id, text in items]
+    if requests:
+        texts.bulk_write(requests, ordered=False)
+
+
+def put_text(cv_id: ObjectId, text: str):
+    put_texts([(cv_id, text)])
+
+
+def get_texts(cv_ids: Iterable[ObjectId]) -> Dict[ObjectId, str]:
+    """Raw texts of the given CVs, as {cv_id: text}; CVs without stored text are left out"""
+    cv_ids = list(cv_ids)
+    if not cv_ids:
+        return {}
+    return {entry["_id"]: decompress_text(entry["data"]) for entry in texts.find({"_id": {"$in": cv_ids}})}
+
+
+def get_text(cv_id: ObjectId) -> Optional[str]:
+    entry = texts.find_one({"_id": cv_id})
+    return decompress_text(entry["data"]) if entry else None
+
+
+def delete_text(cv_id: ObjectId):
+    texts.delete_one({"_id": cv_id})
+
+
+def migrate() -> int:
+    """Move raw_text still embedded in CV documents into the store"""
+    moved = 0
+    while True:
+        batch = list(db.cvs.find({"raw_text": {"$exists": True}}, {"raw_text": 1}).limit(MIGRATE_BATCH_SIZE))
+        if not batch:
+            return moved
+        put_texts((cv["_id"], cv["raw_text"] or "") for cv in batch)
+        db.cvs.update_many(
+            {"_id": {"$in": [cv["_id"] for cv in batch]}},
+            {"$unset": {"raw_text": ""}}
+        )
+        moved += len(batch)
+
+
+if __name__ == "__main__":
+    print(f"Moved the raw text of {migrate()} CVs into cv_texts")
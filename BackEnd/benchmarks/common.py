@@ -0,0 +1,82 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """q-th percentile (0..100) of already sorted samples, by linear interpolation"""
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_samples) - 1)
+    return sorted_samples[low] + (sorted_samples[high] - sorted_samples[low]) * (position - low)
+
+
+def summarize(samples: List[float], errors: int = 0, elapsed: Optional[float] = None) -> dict:
+    """Latency statistics, in milliseconds, of samples given in seconds"""
+    ordered = sorted(samples)
+    stats = {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        "min_ms": ordered[0] * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+    }
+    if errors:
+        stats["errors"] = errors
+    if elapsed:
+        stats["throughput_per_s"] = len(ordered) / elapsed
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    """What a result depends on besides the code, so runs on different machines are not compared blindly"""
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(kind: str, params: dict, results: Dict[str, dict], out: Optional[str] = None) -> str:
+    """Save results as JSON, by default to results/<kind>-<timestamp>.json, and return the path"""
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{kind}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "kind": kind,
+            "created_at": datetime.utcnow().isoformat(),
+            "environment": environment(),
+            "params": params,
+            "results": results,
+        }, f, indent=2)
+    return out
+
+
+def print_results(results: Dict[str, dict]):
+    width = max((len(name) for name in results), default=0)
+    print(f"{'benchmark':{width}s} {'count':>7s} {'p50 ms':>10s} {'p99 ms':>10s} {'mean ms':>10s}")
+    for name, stats in results.items():
+        print(f"{name:{width}s} {stats['count']:>7d} {stats['p50_ms']:>10.3f} {stats['p99_ms']:>10.3f} {stats['mean_ms']:>10.3f}")
+
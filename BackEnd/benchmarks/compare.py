@@ -0,0 +1,56 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare before.json after.json --threshold 0.1
+
+Exits with status 1 when any benchmark present in both files got slower than the threshold
+allows on the chosen statistic.
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    arg_parser.add_argument("baseline")
+    arg_parser.add_argument("candidate")
+    arg_parser.add_argument("--stat", default="p50_ms", help="Statistic compared (default: p50_ms)")
+    arg_parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown counted as a regression")
+    args = arg_parser.parse_args(argv)
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    if baseline["environment"] != candidate["environment"]:
+        differing = sorted(key for key in baseline["environment"] if baseline["environment"][key] != candidate["environment"].get(key))
+        print(f"Note: the runs differ in {', '.join(differing)}")
+
+    names = [name for name in candidate["results"] if name in baseline["results"]]
+    width = max((len(name) for name in names), default=0)
+    regressions = []
+    print(f"{'benchmark':{width}s} {'before':>10s} {'after':>10s} {'change':>8s}")
+    for name in names:
+        before = baseline["results"][name].get(args.stat, 0.0)
+        after = candidate["results"][name].get(args.stat, 0.0)
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:{width}s} {before:>10.3f} {after:>10.3f} {change:>+7.1%}{flag}")
+
+    only = sorted(set(baseline["results"]) ^ set(candidate["results"]))
+    if only:
+        print(f"Only in one of the files: {', '.join(only)}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%} on {args.stat}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Synthetic CV corpus for the benchmarks.
+
+CVs are built from the parser's own source lists (skills from LINKEDIN_SKILLS_ORIGINAL.txt, job
+titles from titles_combined.txt, colleges from world-universities.csv), so the extractors find
+real matches, and are reproducible for a given seed. Length is controlled by the number of words
+in the summary and job descriptions.
+
+    python -m benchmarks.corpus out_dir --count 100 --format both --words 600
+"""
+import argparse
+import csv
+import io
+import itertools
+import os
+import random
+import textwrap
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from app.utils.gazetteer import COLLEGES_CSV, NAMES_CSV, SKILLS_FILE, TITLES_FILE
+
+FALLBACK_FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya", "Rohan", "Meera"]
+FALLBACK_LAST_NAMES = ["Sharma", "Patel", "Iyer", "Reddy", "Nair", "Gupta", "Singh", "Mehta", "Rao", "Kapoor"]
+COMPANY_WORDS = ["Apex", "Blue", "Crest", "Delta", "Nimbus", "Orbit", "Quantum", "Vertex", "Zenith", "Lumen"]
+COMPANY_SUFFIXES = ["Technologies", "Solutions", "Systems", "Labs", "Software", "Consulting", "Pvt Ltd", "Services"]
+DEGREES = ["B.Tech in Computer Science", "B.E. in Information Technology", "M.Tech in Software Engineering",
+           "MBA", "B.Sc in Mathematics", "M.Sc in Data Science"]
+FILLER = (
+    "designed built maintained delivered improved migrated automated reviewed led owned scaled tested "
+    "documented optimized monitored deployed integrated shipped mentored planned features services "
+    "pipelines dashboards reports releases customers teams stakeholders platform modules workflows "
+    "performance reliability latency quality costs requirements production systems data applications"
+).split()
+# PDF layout: lines per A4 page at 10pt and characters per line
+PAGE_LINES = 60
+WRAP_WIDTH = 95
+
+
+@dataclass
+class SyntheticCV:
+    name: str
+    email: str
+    phone: str
+    skills: List[str]
+    # (title, company, start year, end year or "Present"), most recent first
+    jobs: List[Tuple[str, str, int, str]]
+    college: str
+    degree: str
+    text: str = ""
+
+    @property
+    def title(self) -> str:
+        return self.jobs[0][0]
+
+    @property
+    def company(self) -> str:
+        return self.jobs[0][1]
+
+    def parsed(self) -> dict:
+        """A parse result shaped like parse_cv_enhanced's, built from what the CV was generated
+        from, to seed large corpora without running the parser"""
+        return {
+            "name": self.name,
+            "name_candidates": [self.name],
+            "emails": [self.email],
+            "phone_numbers": [self.phone],
+            "skills_by_category": [skill.lower() for skill in self.skills],
+            "skills": [skill.lower() for skill in self.skills],
+            "total_experience_years": float(sum(end_year(end) - start for _, _, start, end in self.jobs)),
+            "job_entries": [
+                {"position": title, "company": company, "start_date": str(start), "end_date": end}
+                for title, company, start, end in self.jobs
+            ],
+            "current_position": self.title,
+            "current_company": self.company,
+            "education": [{"institution": self.college, "raw": self.college, "country": None, "url": None}],
+            "email": self.email,
+            "phone": self.phone,
+            "raw_text": self.text,
+        }
+
+
+def end_year(end: str) -> int:
+    return datetime.now().year if end == "Present" else int(end)
+
+
+def printable(values) -> List[str]:
+    """Entries the PDF base font can render, so text extracted back matches the source"""
+    return sorted(value for value in values if value.isascii() and value.isprintable())
+
+
+def read_source_lines(path: str) -> List[str]:
+    with open(path, encoding="utf-8-sig") as f:
+        return printable({line.strip() for line in f if line.strip()})
+
+
+def read_names(path: str, limit: int = 5000) -> Tuple[List[str], List[str]]:
+    if not os.path.exists(path):
+        return FALLBACK_FIRST_NAMES, FALLBACK_LAST_NAMES
+    first_names, last_names = set(), set()
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in itertools.islice(csv.DictReader(f), limit):
+            if row.get("First Name", "").isalpha():
+                first_names.add(row["First Name"].title())
+            if row.get("Last Name", "").isalpha():
+                last_names.add(row["Last Name"].title())
+    return printable(first_names) or FALLBACK_FIRST_NAMES, printable(last_names) or FALLBACK_LAST_NAMES
+
+
+def read_colleges(path: str) -> List[str]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return printable({row[1] for row in csv.reader(f) if len(row) > 1 and row[1]})
+
+
+class CorpusGenerator:
+    """Reproducible stream of synthetic CVs of about `words` words each"""
+
+    def __init__(self, seed: int = 0, words: int = 600, skills_per_cv: int = 12, jobs_per_cv: int = 3):
+        self.random = random.Random(seed)
+        self.words = words
+        self.skills_per_cv = skills_per_cv
+        self.jobs_per_cv = jobs_per_cv
+        self.skills = read_source_lines(SKILLS_FILE)
+        self.titles = read_source_lines(TITLES_FILE)
+        self.colleges = read_colleges(COLLEGES_CSV)
+        self.first_names, self.last_names = read_names(NAMES_CSV)
+
+    def sentence(self, words: int, mentions: List[str]) -> str:
+        chosen = [self.random.choice(FILLER) for _ in range(max(words - len(mentions), 1))]
+        for mention in mentions:
+            chosen.insert(self.random.randrange(len(chosen) + 1), mention)
+        text = " ".join(chosen)
+        return text[0].upper() + text[1:] + "."
+
+    def paragraph(self, words: int, skills: List[str]) -> List[str]:
+        lines = []
+        while words > 0:
+            length = min(words, self.random.randint(10, 20))
+            mentions = self.random.sample(skills, k=min(len(skills), self.random.randint(0, 2)))
+            lines.append(self.sentence(length, mentions))
+            words -= length
+        return lines
+
+    def company(self) -> str:
+        return f"{self.random.choice(COMPANY_WORDS)} {self.random.choice(COMPANY_WORDS)} {self.random.choice(COMPANY_SUFFIXES)}"
+
+    def generate(self) -> SyntheticCV:
+        first, last = self.random.choice(self.first_names), self.random.choice(self.last_names)
+        skills = self.random.sample(self.skills, self.skills_per_cv)
+        year = datetime.now().year
+        jobs = []
+        end = "Present"
+        for _ in range(self.jobs_per_cv):
+            start = (year if end == "Present" else int(end)) - self.random.randint(1, 4)
+            jobs.append((self.random.choice(self.titles), self.company(), start, end))
+            end = str(start)
+        cv = SyntheticCV(
+            name=f"{first} {last}",
+            email=f"{first.lower()}.{last.lower()}{self.random.randint(1, 999)}@example.com",
+            phone=f"+91 {self.random.randint(70000, 99999)} {self.random.randint(10000, 99999)}",
+            skills=skills,
+            jobs=jobs,
+            college=self.random.choice(self.colleges),
+            degree=self.random.choice(DEGREES),
+        )
+        cv.text = self.render(cv)
+        return cv
+
+    def render(self, cv: SyntheticCV) -> str:
+        # A fifth of the words go to the summary, the rest are spread over the jobs
+        job_words = self.words * 4 // 5 // len(cv.jobs)
+        lines = [cv.name, f"{cv.email} | {cv.phone}", "", "Summary"]
+        lines += self.paragraph(self.words // 5, cv.skills)
+        lines += ["", "Work Experience"]
+        for title, company, start, end in cv.jobs:
+            # Both common layouts: everything on one line, or title, company and dates on their own
+            if self.random.random() < 0.5:
+                lines.append(f"{title} | {company} | {start} - {end}")
+            else:
+                lines += [title, company, f"{start} - {end}"]
+            lines += [f"- {line}" for line in self.paragraph(job_words, cv.skills)]
+            lines.append("")
+        last_start = cv.jobs[-1][2]
+        lines += ["Education", cv.college, f"{cv.degree}, {last_start - 4} - {last_start}", ""]
+        lines += ["Skills", ", ".join(cv.skills)]
+        return "\n".join(lines)
+
+    def __iter__(self) -> Iterator[SyntheticCV]:
+        while True:
+            yield self.generate()
+
+    def take(self, count: int) -> List[SyntheticCV]:
+        return [self.generate() for _ in range(count)]
+
+
+def pdf_bytes(cv: SyntheticCV) -> bytes:
+    import fitz
+
+    lines = [wrapped for line in cv.text.split("\n") for wrapped in (textwrap.wrap(line, WRAP_WIDTH) or [""])]
+    doc = fitz.open()
+    for start in range(0, len(lines), PAGE_LINES):
+        page = doc.new_page()
+        page.insert_text((50, 50), "\n".join(lines[start:start + PAGE_LINES]), fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def docx_bytes(cv: SyntheticCV) -> bytes:
+    import docx
+
+    document = docx.Document()
+    for line in cv.text.split("\n"):
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+WRITERS = {"pdf": pdf_bytes, "docx": docx_bytes}
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+def file_bytes(cv: SyntheticCV, file_type: str) -> bytes:
+    return WRITERS[file_type](cv)
+
+
+def file_name(cv: SyntheticCV, index: int, file_type: str) -> str:
+    return f"{cv.name.replace(' ', '_')}_{index}.{file_type}"
+
+
+def write_corpus(out_dir: str, count: int, formats: List[str], seed: int = 0, words: int = 600) -> int:
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    for index, cv in enumerate(CorpusGenerator(seed, words).take(count)):
+        for file_type in formats:
+            with open(os.path.join(out_dir, file_name(cv, index, file_type)), "wb") as f:
+                f.write(file_bytes(cv, file_type))
+            written += 1
+    return written
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Write synthetic PDF/DOCX CVs")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--format", choices=["pdf", "docx", "both"], default="pdf")
+    parser.add_argument("--words", type=int, default=600, help="Approximate number of words per CV")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    formats = ["pdf", "docx"] if args.format == "both" else [args.format]
+    written = write_corpus(args.out_dir, args.count, formats, args.seed, args.words)
+    print(f"Wrote {written} CVs to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Load test of one API server with a weighted mix of endpoints.
+
+By default a uvicorn server is started for the run, with MONGODB_URI=mongomock:// so the
+database is an in-process fake and uploads land in a scratch directory; --preload starts it
+through app.serve (workers forked from a process that loaded the parser resources) rather than
+`uvicorn --workers`, and --url targets a server that is already running instead. With mongomock
+every server worker holds a database of its own, so runs with --server-workers above 1 need
+--mongodb-uri pointing at a real (empty) MongoDB. A user is registered and a few CVs are
+uploaded (and parsed) first, then --concurrency clients send requests for --duration seconds,
+each picking the next endpoint at random according to --mix:
+
+- login: POST /auth/login
+- upload: POST /upload-cv with a synthetic PDF not uploaded before (as long as the pool lasts)
+- list: GET /list-cvs
+- search: GET /search-cvs with exact and fuzzy queries built from the uploaded CVs
+- download: GET /cv/download/{filename} of an uploaded CV
+
+Throughput, latency percentiles and error rates are reported per endpoint and overall.
+
+    python -m benchmarks.loadtest --concurrency 32 --duration 60 --mix login=1,upload=1,list=4,search=10,download=2
+    python -m benchmarks.loadtest --url http://localhost:8000 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.common import BENCHMARKS_DIR, print_results, summarize, write_results
+from benchmarks.corpus import CONTENT_TYPES, CorpusGenerator, file_bytes, file_name
+from benchmarks.macro import build_queries
+
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+DEFAULT_MIX = "login=1,upload=1,list=4,search=10,download=2"
+ENDPOINTS = ("login", "upload", "list", "search", "download")
+PASSWORD = "load-test-password"
+SERVER_START_TIMEOUT = 120
+PROCESSING_TIMEOUT = 600
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}', expected one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, preload: bool = False, mongodb_uri: str = "mongomock://") -> subprocess.Popen:
+    """uvicorn on the app, by default with a mongomock database, run from a scratch directory"""
+    scratch = tempfile.mkdtemp(prefix="talend-loadtest-")
+    env = dict(os.environ)
+    env.update({
+        "MONGODB_URI": mongodb_uri,
+        "JWT_SECRET": env.get("JWT_SECRET", "load-test"),
+        "SEMANTIC_DIR": os.path.join(scratch, "semantic"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")])),
+    })
+    command = ["app.serve"] if preload else ["uvicorn", "app.main:app"]
+    return subprocess.Popen(
+        [sys.executable, "-m", *command, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=scratch, env=env
+    )
+
+
+async def wait_for_server(client: httpx.AsyncClient, server: Optional[subprocess.Popen]):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise SystemExit(f"The server exited with status {server.returncode}")
+        try:
+            if (await client.get("/metrics")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit("The server did not come up in time")
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.generator = CorpusGenerator(args.seed, args.words)
+        self.email = f"loadtest-{uuid4().hex[:8]}@example.com"
+        self.headers: Dict[str, str] = {}
+        self.stored_filenames: List[str] = []
+        self.queries: List[Tuple[str, bool]] = []
+        self.uploads: List[Tuple[str, bytes]] = []
+        # Files already sent, uploaded again once the prepared pool runs out
+        self.uploaded: List[Tuple[str, bytes]] = []
+        # endpoint -> latencies, error count and status codes of the measured requests
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    async def prepare(self):
+        """Register and log in, upload the initial CVs and wait until they are parsed"""
+        credentials = {"email": self.email, "password": PASSWORD}
+        (await self.client.post("/auth/register", json=credentials)).raise_for_status()
+        response = await self.client.post("/auth/login", json=credentials)
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        cvs = self.generator.take(self.args.initial_cvs)
+        for i, cv in enumerate(cvs):
+            files = {"file": (file_name(cv, i, "pdf"), file_bytes(cv, "pdf"), CONTENT_TYPES["pdf"])}
+            (await self.client.post("/upload-cv", files=files, headers=self.headers)).raise_for_status()
+        deadline = time.monotonic() + PROCESSING_TIMEOUT
+        while True:
+            listed = (await self.client.get("/list-cvs", headers=self.headers)).json()
+            if all(cv["status"] in ("completed", "failed") for cv in listed) or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.5)
+        self.stored_filenames = [cv["stored_filename"] for cv in listed]
+        self.queries = [query for queries in build_queries(cvs, self.args.queries, self.rng).values() for query in queries]
+
+        # Distinct files, so uploads are parsed rather than answered from the parse cache
+        start = len(cvs)
+        self.uploads = [
+            (file_name(cv, i, "pdf"), file_bytes(cv, "pdf"))
+            for i, cv in enumerate(self.generator.take(self.args.upload_pool), start)
+        ]
+
+    def request(self, endpoint: str) -> Tuple[str, str, dict]:
+        if endpoint == "login":
+            return "POST", "/auth/login", {"json": {"email": self.email, "password": PASSWORD}}
+        if endpoint == "upload":
+            name, content = self.uploads.pop() if self.uploads else self.rng.choice(self.uploaded)
+            self.uploaded.append((name, content))
+            return "POST", "/upload-cv", {"files": {"file": (name, content, CONTENT_TYPES["pdf"])}, "headers": self.headers}
+        if endpoint == "list":
+            return "GET", "/list-cvs", {"headers": self.headers}
+        if endpoint == "search":
+            query, fuzzy = self.rng.choice(self.queries)
+            return "GET", "/search-cvs", {"params": {"query": query, "fuzzy": fuzzy}, "headers": self.headers}
+        return "GET", f"/cv/download/{self.rng.choice(self.stored_filenames)}", {}
+
+    async def client_loop(self, endpoints: List[str], weights: List[float], measure_from: float, stop_at: float):
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            endpoint = self.rng.choices(endpoints, weights)[0]
+            method, url, kwargs = self.request(endpoint)
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if started < measure_from:
+                continue
+            self.latencies[endpoint].append(elapsed)
+            self.statuses[endpoint][str(status)] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] += 1
+
+    async def run(self) -> Dict[str, dict]:
+        mix = parse_mix(self.args.mix)
+        if "download" in mix and not self.stored_filenames:
+            raise SystemExit("No CV was uploaded during setup, nothing to download")
+        endpoints, weights = list(mix), list(mix.values())
+        measure_from = time.perf_counter() + self.args.warmup
+        stop_at = measure_from + self.args.duration
+        await asyncio.gather(*(
+            self.client_loop(endpoints, weights, measure_from, stop_at) for _ in range(self.args.concurrency)
+        ))
+        return self.report()
+
+    def report(self) -> Dict[str, dict]:
+        results = {}
+        all_latencies = []
+        for endpoint in ENDPOINTS:
+            latencies = self.latencies.get(endpoint)
+            if not latencies:
+                continue
+            all_latencies.extend(latencies)
+            results[endpoint] = self.endpoint_stats(latencies, self.errors[endpoint])
+            results[endpoint]["statuses"] = dict(self.statuses[endpoint])
+        results["all"] = self.endpoint_stats(all_latencies, sum(self.errors.values()))
+        return results
+
+    def endpoint_stats(self, latencies: List[float], errors: int) -> dict:
+        stats = summarize(latencies, errors, elapsed=self.args.duration)
+        stats["error_rate"] = round(errors / len(latencies), 4) if latencies else 0.0
+        return stats
+
+
+async def run(args) -> Dict[str, dict]:
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port, args.server_workers, args.preload, args.mongodb_uri)
+        url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+            await wait_for_server(client, server)
+            load_test = LoadTest(client, args)
+            await load_test.prepare()
+            return await load_test.run()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description="Load test the API with a weighted mix of endpoints")
+    arg_parser.add_argument("--url", help="Server to test (default: start one on a mongomock database)")
+    arg_parser.add_argument("--server-workers", type=int, default=1, help="uvicorn workers of the started server")
+    arg_parser.add_argument("--preload", action="store_true", help="Start the server through app.serve")
+    arg_parser.add_argument("--mongodb-uri", default="mongomock://", help="Database of the started server (default: mongomock)")
+    arg_parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    arg_parser.add_argument("--concurrency", type=int, default=16, help="Clients sending requests at once")
+    arg_parser.add_argument("--duration", type=float, default=30, help="Seconds measured")
+    arg_parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before measuring")
+    arg_parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    arg_parser.add_argument("--initial-cvs", type=int, default=20, help="CVs uploaded before the run")
+    arg_parser.add_argument("--upload-pool", type=int, default=200, help="Distinct CVs prepared for uploads")
+    arg_parser.add_argument("--queries", type=int, default=10, help="Search queries of each kind")
+    arg_parser.add_argument("--words", type=int, default=400, help="Approximate number of words per CV")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--out", help="Result file (default: benchmarks/results/loadtest-<timestamp>.json)")
+    args = arg_parser.parse_args(argv)
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        arg_parser.error(str(e))
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    print(f"{'endpoint':10s} {'req/s':>9s} {'errors':>8s}")
+    for endpoint, stats in results.items():
+        print(f"{endpoint:10s} {stats.get('throughput_per_s', 0.0):>9.1f} {stats['error_rate']:>8.2%}")
+    params = {key: value for key, value in vars(args).items() if key not in ("out", "mongodb_uri")}
+    params["database"] = "mongomock" if args.mongodb_uri.startswith("mongomock://") else "mongodb"
+    print(f"Results written to {write_results('loadtest', params, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Macro-benchmarks of /upload-cv and /search-cvs at growing corpus sizes.
+
+The app runs in-process behind an ASGI transport, against the mongomock stand-in by default
+(MONGODB_URI=mongomock://, needs mongomock, mongomock-motor and httpx). At each size the corpus
+is first topped up with synthetic CVs, inserted already parsed through
+ingest.insert_parsed_cvs so seeding does not run the parser, then:
+
+- search-cvs/<kind>@<size>: latency of exact (single term, AND, OR, phrase, NOT) and fuzzy
+  queries built from skills and titles of the seeded CVs, with the query cache disabled unless
+  --cache is given
+- upload-cv@<size>: latency of uploading a synthetic PDF, until the CV is queued
+- upload-cv/processed@<size>: time from upload until the ingestion workers finished the CV
+
+mongomock answers every query by scanning the collection in Python, so past a few thousand CVs
+its timings say more about mongomock than about the app: it only runs the 1k size by default.
+--mongodb-uri runs against a local mongod instead (e.g. `docker run -p 27017:27017 mongo`, the
+database must not hold any CVs yet), at 1k/10k/100k CVs by default.
+
+    python -m benchmarks.macro --out mock.json
+    python -m benchmarks.macro --mongodb-uri mongodb://localhost:27017 --out after.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.common import print_results, summarize, write_results
+from benchmarks.corpus import CONTENT_TYPES, CorpusGenerator, SyntheticCV, file_bytes, file_name
+
+BENCH_USER = "benchmark@example.com"
+SEED_BATCH_SIZE = 500
+# CVs kept aside at each size to draw queries from
+QUERY_SOURCE_CVS = 200
+PROCESSING_POLL_INTERVAL = 0.05
+PROCESSING_TIMEOUT = 600
+
+
+def configure(args):
+    """Point the app at the stand-in database and a scratch directory. Runs before any app
+    module is imported, since they read their settings at import time."""
+    os.environ["MONGODB_URI"] = args.mongodb_uri
+    os.environ.setdefault("JWT_SECRET", "benchmark")
+    if not args.cache:
+        os.environ["QUERY_CACHE_BACKEND"] = "none"
+    scratch = tempfile.mkdtemp(prefix="talend-bench-")
+    # Uploaded files land in ./uploaded_cvs and a semantic index is only updated if one exists
+    os.environ.setdefault("SEMANTIC_DIR", os.path.join(scratch, "semantic"))
+    os.chdir(scratch)
+
+
+def drop_mock_indexes():
+    """mongomock answers every query with a scan and enforces unique indexes by scanning the
+    collection on each insert, so on the stand-in indexes only add quadratic insert time"""
+    from app.db.mongodb import db
+
+    for collection in db.list_collection_names():
+        db[collection].drop_indexes()
+
+
+def seed_corpus(generator: CorpusGenerator, count: int, start_index: int) -> Tuple[List[float], List[SyntheticCV]]:
+    """Insert `count` parsed synthetic CVs; returns per-CV insert times and the first CVs inserted"""
+    from app.utils import ingest
+
+    timings, kept = [], []
+    for offset in range(0, count, SEED_BATCH_SIZE):
+        batch = generator.take(min(SEED_BATCH_SIZE, count - offset))
+        entries = []
+        for i, cv in enumerate(batch, start_index + offset):
+            metadata = {
+                "user_email": BENCH_USER,
+                "original_filename": file_name(cv, i, "pdf"),
+                "stored_filename": file_name(cv, i, "pdf"),
+                "file_size": len(cv.text),
+                "file_type": "pdf",
+                "upload_time": datetime.utcnow(),
+                "tags": [],
+            }
+            entries.append((metadata, cv.parsed()))
+        started = time.perf_counter()
+        ingest.insert_parsed_cvs(entries)
+        timings.extend([(time.perf_counter() - started) / len(batch)] * len(batch))
+        kept.extend(batch[:QUERY_SOURCE_CVS - len(kept)])
+    return timings, kept
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """The word with two adjacent letters swapped"""
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def build_queries(cvs: List[SyntheticCV], count: int, rng: random.Random) -> Dict[str, List[Tuple[str, bool]]]:
+    """`count` (query, fuzzy) pairs of each kind, from the skills and titles of `cvs`"""
+    def skill():
+        return rng.choice(rng.choice(cvs).skills).lower()
+
+    def long_word():
+        words = [word for cv in rng.sample(cvs, min(len(cvs), 20)) for s in cv.skills for word in s.lower().split()
+                 if len(word) >= 7 and word.isalpha()]
+        return rng.choice(words) if words else skill()
+
+    queries = {"single": [], "and": [], "or": [], "phrase": [], "not": [], "fuzzy": []}
+    for _ in range(count):
+        cv = rng.choice(cvs)
+        first, second = rng.sample([s.lower() for s in cv.skills], 2)
+        queries["single"].append((f'"{first}"', False))
+        queries["and"].append((f'"{first}" AND "{second}"', False))
+        queries["or"].append((f'"{first}" OR "{skill()}"', False))
+        queries["phrase"].append((f'"{cv.title.lower()}"', False))
+        queries["not"].append((f'"{first}" NOT "{second}"', False))
+        queries["fuzzy"].append((typo(long_word(), rng), True))
+    return queries
+
+
+async def time_requests(client, requests) -> Tuple[List[float], int]:
+    """Send (method, url, kwargs) requests one after the other; returns latencies and error count"""
+    timings, errors = [], 0
+    for method, url, kwargs in requests:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        timings.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+    return timings, errors
+
+
+async def benchmark_search(client, headers, source_cvs, size, args, rng) -> Dict[str, dict]:
+    results = {}
+    for kind, queries in build_queries(source_cvs, args.queries, rng).items():
+        requests = [
+            ("GET", "/search-cvs", {"params": {"query": query, "fuzzy": fuzzy, "limit": args.limit}, "headers": headers})
+            for query, fuzzy in queries
+            for _ in range(args.repeat)
+        ]
+        timings, errors = await time_requests(client, requests)
+        results[f"search-cvs/{kind}@{size}"] = summarize(timings, errors)
+    return results
+
+
+async def benchmark_upload(client, headers, generator, size, args) -> Dict[str, dict]:
+    from starlette.concurrency import run_in_threadpool
+    from bson import ObjectId
+    from app.db.mongodb import db
+
+    timings, errors, uploaded = [], 0, {}
+    for i in range(args.uploads):
+        cv = generator.generate()
+        files = {"file": (file_name(cv, i, "pdf"), file_bytes(cv, "pdf"), CONTENT_TYPES["pdf"])}
+        started = time.perf_counter()
+        response = await client.post("/upload-cv", files=files, headers=headers)
+        timings.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+        else:
+            uploaded[ObjectId(response.json()["cv_id"])] = started
+
+    # Time until each uploaded CV has been parsed, stored and indexed by the ingestion workers
+    processed = []
+    deadline = time.perf_counter() + PROCESSING_TIMEOUT
+    while uploaded and time.perf_counter() < deadline:
+        done = await run_in_threadpool(lambda: [
+            cv["_id"] for cv in db.cvs.find(
+                {"_id": {"$in": list(uploaded)}, "processing_status": {"$in": ["completed", "failed"]}}, {"_id": 1}
+            )
+        ])
+        now = time.perf_counter()
+        for cv_id in done:
+            processed.append(now - uploaded.pop(cv_id))
+        await asyncio.sleep(PROCESSING_POLL_INTERVAL)
+    return {
+        f"upload-cv@{size}": summarize(timings, errors),
+        f"upload-cv/processed@{size}": summarize(processed, len(uploaded)),
+    }
+
+
+async def run(args) -> Dict[str, dict]:
+    import httpx
+    from starlette.concurrency import run_in_threadpool
+    from app.db.mongodb import USE_MOCK, db
+    from app.main import app
+    from app.utils.auth import create_access_token
+
+    if await run_in_threadpool(db.cvs.estimated_document_count):
+        raise SystemExit("The benchmark database already holds CVs; point --mongodb-uri at an empty one")
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': BENCH_USER}, expires_minutes=24 * 60)}"}
+    generator = CorpusGenerator(args.seed, args.words)
+    rng = random.Random(args.seed)
+    results, seeded, source_cvs = {}, 0, []
+    # Runs the startup and shutdown handlers: indexes and the ingestion workers
+    async with app.router.lifespan_context(app):
+        if USE_MOCK:
+            await run_in_threadpool(drop_mock_indexes)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for size in args.sizes:
+                if size > seeded:
+                    started = time.perf_counter()
+                    timings, kept = await run_in_threadpool(seed_corpus, generator, size - seeded, seeded)
+                    results[f"seed@{size}"] = summarize(timings, elapsed=time.perf_counter() - started)
+                    source_cvs.extend(kept[:QUERY_SOURCE_CVS - len(source_cvs)])
+                    seeded = size
+                results.update(await benchmark_search(client, headers, source_cvs, size, args, rng))
+                results.update(await benchmark_upload(client, headers, generator, size, args))
+                seeded += args.uploads
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark /upload-cv and /search-cvs at growing corpus sizes")
+    arg_parser.add_argument("--sizes", help="Comma separated corpus sizes (default: 1000 on mongomock, else 1000,10000,100000)")
+    arg_parser.add_argument("--words", type=int, default=400, help="Approximate number of words per CV")
+    arg_parser.add_argument("--queries", type=int, default=10, help="Distinct queries of each kind per size")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Times each query is sent")
+    arg_parser.add_argument("--limit", type=int, default=50, help="limit parameter of the searches")
+    arg_parser.add_argument("--uploads", type=int, default=20, help="CVs uploaded per size")
+    arg_parser.add_argument("--cache", action="store_true", help="Keep the search query cache enabled")
+    arg_parser.add_argument("--mongodb-uri", default="mongomock://", help="Database to run against (default: in-process mongomock)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--out", help="Result file (default: benchmarks/results/macro-<timestamp>.json)")
+    args = arg_parser.parse_args(argv)
+    if args.sizes is None:
+        args.sizes = "1000" if args.mongodb_uri.startswith("mongomock://") else "1000,10000,100000"
+    args.sizes = sorted(int(size) for size in args.sizes.split(","))
+    if args.out:
+        args.out = os.path.abspath(args.out)
+
+    configure(args)
+    results = asyncio.run(run(args))
+    print_results(results)
+    params = {key: value for key, value in vars(args).items() if key not in ("out", "mongodb_uri")}
+    params["database"] = "mongomock" if args.mongodb_uri.startswith("mongomock://") else "mongodb"
+    print(f"Results written to {write_results('macro', params, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Micro-benchmarks of the parser extractors and compute_match_score.
+
+Every benchmark cycles through the same synthetic CVs, with everything it does not measure (the
+NER doc, the segments, the extracted text) computed beforehand, and records the latency of each
+call. Text extraction reads the PDF and DOCX from temporary files, as ingestion reads uploads.
+
+    python -m benchmarks.micro --cvs 50 --words 600 --iterations 500
+    python -m benchmarks.micro --only skills,education --out before.json
+"""
+import argparse
+import atexit
+import itertools
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.utils import parser
+from app.utils.scorer import compute_match_score
+from app.utils.segmenter import CVSegments
+from benchmarks.common import print_results, summarize, write_results
+from benchmarks.corpus import CorpusGenerator, docx_bytes, pdf_bytes
+
+
+def write_temp(content: bytes, suffix: str) -> str:
+    """Path of a temporary file holding `content`, removed when the interpreter exits"""
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="talend-micro-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    atexit.register(os.remove, path)
+    return path
+
+
+class Sample:
+    """One CV with the inputs of every stage precomputed"""
+
+    def __init__(self, cv, query: str):
+        self.cv = cv
+        self.text = cv.text
+        self.query = query
+        self.segments = CVSegments(cv.text)
+        self.doc = parser.run_ner(cv.text)
+        self.pdf = write_temp(pdf_bytes(cv), ".pdf")
+        self.docx = write_temp(docx_bytes(cv), ".docx")
+        self.experience_lines = parser.experience_lines(self.segments)
+        self.job_entries = parser.extract_job_entries(self.experience_lines)
+        self.parsed = parser.parse_cv_enhanced(cv.text, doc=self.doc)
+
+
+BENCHMARKS: Dict[str, Callable[[Sample], object]] = {
+    "extract_text_from_pdf": lambda s: parser.extract_text_from_pdf(s.pdf),
+    "extract_text_from_docx": lambda s: parser.extract_text_from_docx(s.docx),
+    "segment": lambda s: CVSegments(s.text),
+    "nlp": lambda s: parser.run_ner(s.text),
+    "name": lambda s: parser.extract_name_enhanced(s.segments, s.doc),
+    "emails": lambda s: parser.extract_emails(s.text),
+    "phones": lambda s: parser.extract_phone_numbers(s.text),
+    "skills": lambda s: parser.extract_skills_enhanced(s.segments),
+    "experience": lambda s: parser.extract_work_experience(s.segments),
+    "job_entries": lambda s: parser.extract_job_entries(s.experience_lines),
+    "current_position": lambda s: parser.extract_current_position(s.segments),
+    "current_company": lambda s: parser.extract_current_company(s.text, s.job_entries),
+    "education": lambda s: parser.extract_education_enhanced(s.segments),
+    "parse_cv_enhanced": lambda s: parser.parse_cv_enhanced(s.text, doc=s.doc),
+    "compute_match_score": lambda s: compute_match_score(
+        s.text, s.query, skills=s.parsed["skills"], position=s.parsed["current_position"],
+        company=s.parsed["current_company"], name=s.parsed["name"], email=s.parsed["email"]
+    ),
+}
+
+
+def build_samples(count: int, words: int, seed: int) -> List[Sample]:
+    generator = CorpusGenerator(seed, words)
+    cvs = generator.take(count)
+    samples = []
+    for cv in cvs:
+        # Queries that partly match: two of the CV's skills plus a title of another CV
+        other = generator.random.choice(cvs)
+        query = " ".join(generator.random.sample(cv.skills, 2) + [other.title])
+        samples.append(Sample(cv, query))
+    return samples
+
+
+def run(name: str, samples: List[Sample], iterations: int, warmup: int) -> dict:
+    benchmark = BENCHMARKS[name]
+    for sample in itertools.islice(itertools.cycle(samples), warmup):
+        benchmark(sample)
+    timings = []
+    for sample in itertools.islice(itertools.cycle(samples), iterations):
+        started = time.perf_counter()
+        benchmark(sample)
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark the parser extractors and compute_match_score")
+    arg_parser.add_argument("--cvs", type=int, default=50, help="Distinct synthetic CVs cycled through")
+    arg_parser.add_argument("--words", type=int, default=600, help="Approximate number of words per CV")
+    arg_parser.add_argument("--iterations", type=int, default=500, help="Timed calls per benchmark")
+    arg_parser.add_argument("--warmup", type=int, default=20)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--only", help=f"Comma separated subset of: {', '.join(BENCHMARKS)}")
+    arg_parser.add_argument("--out", help="Result file (default: benchmarks/results/micro-<timestamp>.json)")
+    args = arg_parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        arg_parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    parser.load_resources()
+    samples = build_samples(args.cvs, args.words, args.seed)
+    results = {name: run(name, samples, args.iterations, args.warmup) for name in names}
+    print_results(results)
+    params = {key: value for key, value in vars(args).items() if key != "out"}
+    print(f"Results written to {write_results('micro', params, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
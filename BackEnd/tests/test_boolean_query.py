@@ -0,0 +1,96 @@
+import pytest
+from bson import ObjectId
+
+from app.utils.boolean_query import (And, Not, Or, QuerySyntaxError, Term, canonical, execute, parse_query,
+                                     plan)
+
+CVS = {
+    "ml": "python machine learning sql",
+    "backend": "java sql",
+    "both": "python java",
+    "reversed": "learning machine rust",
+    "rust": "rust",
+    "reporting": "sql reporting",
+}
+IDS = {name: ObjectId() for name in CVS}
+
+
+def build_postings():
+    postings_by_term = {}
+    for name, text in CVS.items():
+        for position, token in enumerate(text.split()):
+            entry = postings_by_term.setdefault(token, {}).setdefault(IDS[name], {"positions": []})
+            entry["positions"].append(position)
+    return postings_by_term
+
+
+POSTINGS = build_postings()
+
+
+def run(query):
+    node = plan(parse_query(query), POSTINGS)
+    matched = execute(node, POSTINGS, universe=lambda: set(IDS.values()))
+    return {name for name, cv_id in IDS.items() if cv_id in matched}
+
+
+def term(token):
+    return Term((token,))
+
+
+def test_and_binds_tighter_than_or():
+    assert parse_query("python OR java AND sql") == Or((term("python"), And((term("java"), term("sql")))))
+    assert run("python OR java AND sql") == {"ml", "both", "backend"}
+    assert run("rust OR java AND sql") == {"reversed", "rust", "backend"}
+
+
+def test_adjacent_operands_are_anded():
+    assert parse_query("python java") == parse_query("python AND java") == And((term("python"), term("java")))
+    assert run("python java") == {"both"}
+
+
+def test_not_at_top_level():
+    assert parse_query("NOT python") == parse_query("-python") == Not(term("python"))
+    assert run("NOT python") == {"backend", "reversed", "rust", "reporting"}
+    assert run("sql -python") == {"backend", "reporting"}
+
+
+def test_not_under_or():
+    assert parse_query("java OR NOT python") == Or((term("java"), Not(term("python"))))
+    assert run("java OR NOT python") == {"backend", "both", "reversed", "rust", "reporting"}
+
+
+def test_parentheses_override_precedence():
+    assert parse_query("(python OR java) AND sql") == And((Or((term("python"), term("java"))), term("sql")))
+    assert run("(python OR java) AND sql") == {"ml", "backend"}
+    assert run("python OR (java AND sql)") == {"ml", "both", "backend"}
+    assert run("NOT (python OR java)") == {"reversed", "rust", "reporting"}
+
+
+def test_quoted_phrase_needs_consecutive_terms():
+    assert parse_query('"machine learning"') == Term(("machine", "learning"))
+    assert run('"machine learning"') == {"ml"}
+    assert run("machine learning") == {"ml", "reversed"}
+    assert run('"learning machine" OR "python java"') == {"reversed", "both"}
+
+
+@pytest.mark.parametrize("query", ["(python", "python)", "python AND", "OR python", "python OR",
+                                   "NOT", "()", '"machine learning', "python (java OR)"])
+def test_malformed_queries_raise(query):
+    with pytest.raises(QuerySyntaxError):
+        parse_query(query)
+
+
+def test_canonical_ignores_operand_order():
+    first = parse_query("python AND (java OR sql)")
+    second = parse_query("(sql || java) && python")
+    assert first != second
+    assert canonical(first) == canonical(second)
+    assert canonical(parse_query("python AND -java")) == canonical(parse_query("NOT java python"))
+    assert canonical(first) != canonical(parse_query("python OR java OR sql"))
+    assert canonical(parse_query('"machine learning"')) != canonical(parse_query('"learning machine"'))
+
+
+def test_plan_puts_selective_operands_first_and_negations_last():
+    planned = plan(parse_query("NOT java sql machine"), POSTINGS)
+    assert planned.children == (term("machine"), term("sql"), Not(term("java")))
+    assert run("NOT java sql machine") == {"ml"}
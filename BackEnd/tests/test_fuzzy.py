@@ -0,0 +1,91 @@
+import random
+import string
+
+import pytest
+
+from app.utils.fuzzy import GRAM_SIZE, TrigramIndex, bounded_edit_distance, max_edits, trigrams
+
+
+def edit_distance(a, b):
+    """Unbounded optimal string alignment distance, as a reference"""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+
+def random_edit(rng, term):
+    i = rng.randrange(len(term))
+    op = rng.choice(["insert", "delete", "substitute", "swap"])
+    if op == "insert":
+        return term[:i] + rng.choice(string.ascii_lowercase) + term[i:]
+    if op == "delete":
+        return term[:i] + term[i + 1:]
+    if op == "substitute":
+        return term[:i] + rng.choice(string.ascii_lowercase) + term[i + 1:]
+    i = min(i, len(term) - 2)
+    return term[:i] + term[i + 1] + term[i] + term[i + 2:]
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("python", "python", 0),
+    ("python", "pyhton", 1),
+    ("abcd", "acbd", 1),
+    ("kubernetes", "kubernets", 1),
+    ("java", "jav", 1),
+    ("java", "lava", 1),
+    ("developer", "devolepr", 3),
+    ("ca", "abc", 3),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b) == distance
+    assert bounded_edit_distance(a, b, 2) == (distance if distance <= 2 else None)
+    assert bounded_edit_distance(a, b, distance) == distance
+
+
+def test_bounded_edit_distance_matches_reference():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 7)))
+        b = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 7)))
+        limit = rng.randint(0, 3)
+        distance = edit_distance(a, b)
+        assert bounded_edit_distance(a, b, limit) == (distance if distance <= limit else None)
+
+
+def test_edits_lose_at_most_gram_size_plus_one_trigrams_each():
+    rng = random.Random(1)
+    for _ in range(2000):
+        term = "".join(rng.choice(string.ascii_lowercase[:6]) for _ in range(rng.randint(2, 12)))
+        variant = term
+        for _ in range(rng.randint(1, 2)):
+            if len(variant) >= 2:
+                variant = random_edit(rng, variant)
+        k = edit_distance(term, variant)
+        assert len(trigrams(term) & trigrams(variant)) >= len(trigrams(term)) - (GRAM_SIZE + 1) * k
+
+
+def test_short_term_one_swap_away_shares_no_trigram_but_is_found():
+    assert not trigrams("acbd") & trigrams("abcd")
+    index = TrigramIndex([("abcd", 3), ("abcde", 1), ("xyzw", 5)])
+    assert index.similar("acbd") == [("abcd", 1)]
+
+
+def test_similar_finds_every_term_within_max_edits():
+    rng = random.Random(2)
+    vocabulary = {"".join(rng.choice("abcde") for _ in range(rng.randint(2, 10))) for _ in range(400)}
+    index = TrigramIndex((term, 1) for term in vocabulary)
+    for query in list(vocabulary)[:100] + ["".join(rng.choice("abcde") for _ in range(6)) for _ in range(50)]:
+        k = max_edits(query)
+        expected = {term for term in vocabulary if edit_distance(query, term) <= k}
+        assert {term for term, _ in index.similar(query)} == expected
+
+
+def test_similar_orders_by_distance_then_frequency_and_skips_removed_terms():
+    index = TrigramIndex([("python", 2), ("pyhton", 9), ("pythons", 4), ("jython", 1)])
+    assert index.similar("python") == [("python", 0), ("pyhton", 1), ("pythons", 1), ("jython", 1)]
+    index.update({"pythons": 0})
+    assert index.similar("python", limit=3) == [("python", 0), ("pyhton", 1), ("jython", 1)]
@@ -0,0 +1,75 @@
+import re
+
+import marisa_trie
+import pytest
+
+from app.utils import gazetteer
+from app.utils.gazetteer import GazetteerIndex, TrieGazetteerIndex, regex_boundary, token_boundary
+from app.utils.parser import extract_skills_enhanced
+from benchmarks.corpus import CorpusGenerator
+
+BOUNDARY_SKILLS = ["c", "c++", "c#", "r", "node.js", "java", "javascript", "machine learning",
+                   "learning", "deep learning", "asp.net", ".net", "sql", "ms sql"]
+
+CVS = [
+    "Senior developer. Skills: C++, C#, Java, JavaScript and Node.js; R for statistics.\n"
+    "Worked on machine learning and deep learning pipelines with MS SQL and ASP.NET.",
+    # c++ followed by a non-word character has no \b after it, so it is not a whole-word match
+    "Languages: c++ c++11 c++/cli objective-c; frameworks: node.js, node.jsx, asp.net.core",
+    # "r" and "c" only inside other words, plus a trailing phrase at the end of the text
+    "Recruiter at Crate & Barrel, responsible for career fairs. Interested in learning",
+    "java-script javascripts java_script ms  sql ms\nsql .net .netcore",
+    "",
+]
+
+
+def regex_skills(text, skills):
+    """The matcher extract_skills_enhanced replaced: one whole-word regex search per skill"""
+    text_lower = text.lower()
+    return {skill for skill in skills if re.search(r'\b' + re.escape(skill) + r'\b', text_lower)}
+
+
+def trie_index(phrases, boundary=regex_boundary):
+    return TrieGazetteerIndex(marisa_trie.Trie(phrases), boundary, max(map(len, phrases)))
+
+
+@pytest.fixture(scope="module")
+def corpus_cvs():
+    return [CorpusGenerator(seed).render(CorpusGenerator(seed).generate()) for seed in range(3)]
+
+
+@pytest.mark.parametrize("text", CVS)
+def test_index_matches_per_skill_regex(text):
+    assert GazetteerIndex(BOUNDARY_SKILLS).find_all(text.lower()) == regex_skills(text, BOUNDARY_SKILLS)
+
+
+def test_boundary_cases():
+    found = GazetteerIndex(BOUNDARY_SKILLS).find_all(CVS[0].lower())
+    assert {"c", "java", "javascript", "node.js", "r", "machine learning", "learning",
+            "deep learning", "ms sql", "sql", "asp.net", ".net"} <= found
+    # Like the regex: "c++," and "c#," have no word boundary after their last character
+    assert "c++" not in found and "c#" not in found
+    assert GazetteerIndex(BOUNDARY_SKILLS).find_all(CVS[2].lower()) == {"learning"}
+
+
+@pytest.mark.parametrize("text", CVS)
+@pytest.mark.parametrize("boundary", [regex_boundary, token_boundary])
+def test_trie_index_matches_set_index(text, boundary):
+    expected = list(GazetteerIndex(BOUNDARY_SKILLS, boundary).finditer(text.lower()))
+    assert list(trie_index(BOUNDARY_SKILLS, boundary).finditer(text.lower())) == expected
+
+
+def test_extract_skills_matches_per_skill_regex(corpus_cvs):
+    skills = gazetteer.read_lines(gazetteer.SKILLS_FILE)
+    for text in CVS + corpus_cvs:
+        assert set(extract_skills_enhanced(text)) == regex_skills(text, skills)
+
+
+def test_compiled_artifacts_match_sources(tmp_path, corpus_cvs):
+    gazetteer.build_artifacts(str(tmp_path))
+    compiled = gazetteer.load_artifacts(str(tmp_path))
+    sources = gazetteer.load_sources()
+    for text in CVS + corpus_cvs:
+        text = text.lower()
+        for table in ("skills", "titles", "colleges"):
+            assert list(getattr(compiled, table).finditer(text)) == list(getattr(sources, table).finditer(text))